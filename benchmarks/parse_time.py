@@ -0,0 +1,99 @@
+'''
+Parse throughput benchmark for modules.reminder_tools.parse_time.
+
+Strings combine a pool of time expressions, smaller than the parse cache, with unique task text,
+so the cache hit rate reflects real /remindme calls rather than repeated whole strings.
+
+Usage: python -m benchmarks.parse_time [--count N] [--prefixes N] [--threads N]
+'''
+import time
+import random
+import argparse
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from modules.reminder_tools import parse_time, parse_tokens, EXAMPLES, PARSE_CACHE_SIZE
+
+MONTHS = ["jan", "feb", "march", "april", "may", "june", "jul", "aug", "sept", "oct", "nov", "december"]
+WEEKDAYS = ["mon", "tuesday", "wed", "thursday", "fri", "saturday", "sun", "tmr", "tomorrow"]
+UNITS = ["y", "mo", "w", "d", "h", "m", "s"]
+TASKS = ["", "drink water", "do laundry", "stand-up", "kiss the homies", "pay rent before the 1st"]
+
+def fuzz(rng: random.Random) -> str:
+    '''
+    Returns a random time expression in the style of the help-text examples.
+    '''
+    kind = rng.randrange(4)
+
+    if kind == 0:
+        string = "in " * rng.randrange(2) + "".join(f"{rng.randint(1, 59)}{rng.choice(UNITS)}" for _ in range(rng.randint(1, 3)))
+    elif kind == 1:
+        string = f"at {rng.randint(1, 12)}{rng.choice(['', ':05', ':30', ':45'])}{rng.choice(['', 'am', 'pm', ' p'])}"
+        string += rng.choice(["", f" on {rng.choice(MONTHS)} {rng.randint(1, 28)}"])
+    elif kind == 2:
+        string = f"on {rng.choice(MONTHS)} {rng.randint(1, 28)}{rng.choice(['', ' 2031', ', 2032'])}"
+    else:
+        string = f"{rng.choice(WEEKDAYS)} {rng.choice(['', 'at '])}{rng.randint(1, 12)}{rng.choice(['am', 'pm', ''])}"
+
+    if rng.random() < 0.3:
+        string = string.upper()
+
+    return string
+
+def corpus(count: int, prefixes: int = 1000, seed: int = 0) -> list[str]:
+    '''
+    Returns the help-text examples followed by `count` strings, each a time expression from a pool of `prefixes` and a unique task.
+    '''
+    rng = random.Random(seed)
+    pool = [fuzz(rng) for _ in range(prefixes)]
+    return [example.removeprefix("/remindme ") for example in EXAMPLES] + [f"{rng.choice(pool)} {rng.choice(TASKS)} #{i}" for i in range(count)]
+
+def run(strings: list[str], now: datetime.datetime) -> float:
+    '''
+    Parses every string. Returns parses per second.
+    '''
+    start = time.perf_counter()
+    for string in strings:
+        parse_time(string, now)
+    return len(strings) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20000, help="number of fuzzed strings")
+    parser.add_argument("--prefixes", type=int, default=1000, help="distinct time expressions, at most the parse cache size")
+    parser.add_argument("--threads", type=int, default=4, help="thread pool size")
+    args = parser.parse_args()
+
+    if args.prefixes > PARSE_CACHE_SIZE:
+        parser.error(f"--prefixes must be at most the parse cache size ({PARSE_CACHE_SIZE})")
+
+    strings = corpus(args.count, args.prefixes)
+    now = datetime.datetime.now(datetime.timezone.utc).astimezone()
+
+    # every string must parse
+    for string in strings:
+        parse_time(string, now)
+
+    parse_tokens.cache_clear()
+    cold = run(strings, now)
+    cold_info = parse_tokens.cache_info()
+    warm = run(strings, now)
+
+    # re-entrancy: each thread uses its own reference time
+    def job(offset: int):
+        return [parse_time(string, now + datetime.timedelta(hours=offset)) for string in strings]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(job, range(args.threads)))
+    threaded = args.threads * len(strings) / (time.perf_counter() - start)
+
+    assert results[0] == job(0)
+
+    print(f"strings:  {len(strings)}")
+    print(f"cold:     {cold:,.0f} parses/s ({100 * cold_info.hits / (cold_info.hits + cold_info.misses):.1f}% cache hits)")
+    print(f"warm:     {warm:,.0f} parses/s")
+    print(f"threaded: {threaded:,.0f} parses/s ({args.threads} threads)")
+    print(f"cache:    {parse_tokens.cache_info()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+'''
+Scaling benchmark for the reminder subsystem.
+
+Drives ReminderCog through a fake bot and context against synthetic databases.
+Each size runs in its own process so peak RSS is measured per size.
+
+Usage: python -m benchmarks.reminders [--sizes 10000,100000,1000000] [--out results.json]
+'''
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import resource
+import tempfile
+import statistics
+import subprocess
+from types import SimpleNamespace
+
+from cogs.reminder import ReminderCog, DB_PATH
+from modules.reminder_tools import ReminderDB
+
+class FakeUser():
+    def __init__(self, id: int):
+        self.id = id
+        self.display_name = f"user{id}"
+        self.display_avatar = None
+
+    async def send(self, **kwargs):
+        pass
+
+class FakeBot():
+    def get_user(self, id: int):
+        return FakeUser(id)
+
+    async def fetch_user(self, id: int):
+        return FakeUser(id)
+
+    async def wait_until_ready(self):
+        pass
+
+class FakeContext():
+    def __init__(self, id: int):
+        self.author = FakeUser(id)
+        self.message = SimpleNamespace(created_at=datetime.datetime.now(datetime.timezone.utc), jump_url="https://discord.com/channels/0/0/0")
+
+    async def send(self, **kwargs):
+        pass
+
+def generate(path: str, size: int, per_user: int, seed: int = 0):
+    '''
+    Writes `size` pending reminders spread over `size / per_user` users.
+    '''
+    rng = random.Random(seed)
+    now = round(time.time())
+    users = max(1, size // per_user)
+
+    storage = ReminderDB(path)
+    with storage.conn:
+        storage.conn.executemany("INSERT INTO reminders (user_id, time, task, url, created, modified, repeat) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 ((rng.randrange(users) + 1, now + rng.randint(86400, 86400*365), f"task {i}", "https://discord.com/channels/0/0/0",
+                                   now, now, "1d" if i % 20 == 0 else None) for i in range(size)))
+    storage.close()
+
+async def timed(fn, runs: int) -> float:
+    '''
+    Returns the median runtime of a function or coroutine function in milliseconds.
+    '''
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        if asyncio.iscoroutine(result := fn()):
+            await result
+        samples.append(1000 * (time.perf_counter() - start))
+    return statistics.median(samples)
+
+async def bench(size: int, per_user: int, runs: int) -> dict:
+    results = {'size': size, 'per_user': per_user}
+
+    start = time.perf_counter()
+    generate(DB_PATH, size, per_user)
+    results['generate_s'] = time.perf_counter() - start
+
+    # load
+    start = time.perf_counter()
+    cog = ReminderCog(FakeBot())
+    results['load_s'] = time.perf_counter() - start
+
+    # drive the loop manually
+    cog.catch_up.cancel()
+    cog.remind.cancel()
+
+    # idle tick
+    now = time.time()
+    results['idle_tick_ms'] = await timed(lambda: cog.scheduler.pop_due(now), runs)
+
+    # burst tick, 100 reminders already due so the tick does not sleep in scheduler.wait()
+    async def burst():
+        due = round(now) - 1
+        for i in range(100):
+            id = str(10**9 + i)
+            reminder = {'time': due, 'task': "burst", 'url': "https://discord.com/channels/0/0/0", 'created': due, 'modified': due, 'repeat': None, 'channel': None}
+            cog.add_user(id)
+            cog.db[id].add(reminder)
+            cog.scheduler.push(id, reminder)
+            cog.storage.insert(id, reminder)
+        start = time.perf_counter()
+        await cog.remind.coro(cog)
+        return time.perf_counter() - start
+    results['burst_tick_ms'] = 1000 * await burst()
+
+    # commands
+    ctx = FakeContext(1)
+    results['remindme_ms'] = await timed(lambda: cog.remindme.callback(cog, ctx, string="in 2h benchmark"), runs)
+    results['info_ms'] = await timed(lambda: cog.info.callback(cog, ctx, index=None), runs)
+    results['rm_ms'] = await timed(lambda: cog.rm.callback(cog, ctx, indexes="1"), runs)
+    results['reminders_ms'] = await timed(lambda: cog.reminders.callback(cog, ctx), runs)
+
+    # persistence
+    reminder = {'time': round(now) + 86400, 'task': "persist", 'url': "", 'created': round(now), 'modified': round(now)}
+    results['insert_ms'] = await timed(lambda: cog.storage.insert(1, reminder), runs)
+    results['delete_ms'] = await timed(lambda: cog.storage.delete([reminder]), runs)
+
+    await cog.cog_unload()
+
+    results['db_bytes'] = sum(os.path.getsize(DB_PATH + suffix) for suffix in ("", "-wal") if os.path.exists(DB_PATH + suffix))
+    results['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma separated database sizes")
+    parser.add_argument("--per-user", type=int, default=100, help="average reminders per user")
+    parser.add_argument("--runs", type=int, default=20, help="samples per measurement")
+    parser.add_argument("--out", help="write results to this json file")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # child process: run one size in a scratch directory
+    if args.single:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            os.mkdir("json")
+            print(json.dumps(asyncio.run(bench(args.single, args.per_user, args.runs))))
+        return
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        proc = subprocess.run([sys.executable, "-m", "benchmarks.reminders", "--single", str(size), "--per-user", str(args.per_user), "--runs", str(args.runs)],
+                              capture_output=True, text=True, check=True)
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        print(json.dumps(results[-1]), file=sys.stderr)
+
+    output = {'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(), 'python': sys.version.split()[0], 'results': results}
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(output, f, indent=4)
+    else:
+        print(json.dumps(output, indent=4))
+
+if __name__ == "__main__":
+    main()
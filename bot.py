@@ -4,6 +4,7 @@ import asyncio
 import datetime
 from datetime import timedelta
 from dotenv import load_dotenv
+from modules.riot_tools import RateLimited
 
 import discord
 from discord.ext import commands
@@ -27,6 +28,10 @@ async def on_ready():
 
 @bot.event
 async def on_command_error(ctx, exception):
+    # errors from slash invocations of hybrid commands are wrapped twice
+    if isinstance(exception, commands.errors.HybridCommandError) and isinstance(exception.original, discord.app_commands.CommandInvokeError):
+        exception = commands.errors.CommandInvokeError(exception.original.original)
+
     if isinstance(exception, commands.errors.CommandNotFound):
         await error(ctx, "Command not found.")
     elif isinstance(exception, commands.errors.MissingRequiredArgument):
@@ -37,6 +42,8 @@ async def on_command_error(ctx, exception):
         await error(ctx, 'You do not have access to this command.')
     elif isinstance(exception, commands.errors.CommandOnCooldown):
         await error(ctx, f'Command is on cooldown.\nTry again <t:{round((datetime.datetime.now() + timedelta(seconds=exception.retry_after)).timestamp())}:R>.')
+    elif isinstance(exception, commands.errors.CommandInvokeError) and isinstance(exception.original, RateLimited):
+        await error(ctx, f'The Riot API is busy.\nTry again <t:{round((datetime.datetime.now() + timedelta(seconds=exception.original.retry_after)).timestamp())}:R>.')
     elif isinstance(exception, commands.errors.CommandError):
         #await error(ctx, 'Something went wrong. That\'s all we know.')
         await error(ctx, exception)
@@ -77,7 +84,7 @@ async def load():
 
 async def main():
     # create missing directories
-    for directory in ["json", "downloads"]:
+    for directory in ["json", "downloads", "cache"]:
         if not os.path.exists(directory):
             os.mkdir(directory)
 
@@ -1,58 +1,243 @@
-import json
+import io
 import re
+import asyncio
+import zoneinfo
 import datetime
 from datetime import timedelta
-from modules.reminder_tools import parse_time
+from collections import OrderedDict
+from modules.reminder_tools import parse_reminder, match_timedelta, next_occurrence, add_interval, describe_repeat, ReminderList, Scheduler, ReminderDB, EXAMPLES
+from modules.reminder_tools import get_zone_names, local_time, to_timestamp, timestamp, to_ics, from_ics, expand_series
 
 import discord
 from discord.ext import commands, tasks
 
 JSON_PATH = 'json//reminders.json'
-DATE_PATTERN = r"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}-[0-9]{2}:[0-9]{2}"
+DB_PATH = 'json//reminders.db'
+
+MAX_CACHED_USERS = 1000
+MAX_CONCURRENT_SENDS = 10
+CATCH_UP_DELAY = 0.5
+ARCHIVE_DAYS = 7
+PAGE_SIZE = 10
+
+# characters per /reminders page, embed descriptions are limited to 4096, and of each task shown on it
+PAGE_CHARS = 4000
+TASK_PREVIEW = 300
+
+ROLE_MENTION = re.compile(r'<@&([0-9]+)>')
+
+SNOOZE = {
+    '10m': ("10 min", timedelta(minutes=10)),
+    '1h':  ("1 hour", timedelta(hours=1)),
+    '1d':  ("Tomorrow", timedelta(days=1)),
+}
+
+class ReminderButton(discord.ui.DynamicItem[discord.ui.Button], template=r'reminder:(?P<action>10m|1h|1d|done):(?P<id>[0-9]+)'):
+    '''
+    Snooze/Done button on a delivered reminder.
+
+    The action and reminder ID are encoded in the custom ID, so the buttons keep working across restarts.
+    '''
+    def __init__(self, action: str, id: int):
+        if action == 'done':
+            button = discord.ui.Button(label="Done", style=discord.ButtonStyle.green, custom_id=f'reminder:{action}:{id}')
+        else:
+            button = discord.ui.Button(label=SNOOZE[action][0], style=discord.ButtonStyle.grey, custom_id=f'reminder:{action}:{id}')
+
+        super().__init__(button)
+        self.action = action
+        self.id = id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match['action'], int(match['id']))
+
+    async def callback(self, interaction: discord.Interaction):
+        cog: ReminderCog = interaction.client.get_cog("ReminderCog")
+        await cog.snooze(interaction, self.action, self.id)
+
+def reminder_buttons(reminder: dict) -> discord.ui.View:
+    '''
+    Returns the Snooze/Done buttons for a delivered reminder.
+
+    The view is stopped so it is not kept in memory, interactions are dispatched to :class:`ReminderButton`.
+    '''
+    view = discord.ui.View(timeout=None)
+    for action in SNOOZE:
+        view.add_item(ReminderButton(action, reminder['id']))
+    if not reminder['repeat']:
+        view.add_item(ReminderButton('done', reminder['id']))
+    view.stop()
+    return view
+
+class ReminderPaginationView(discord.ui.View):
+    '''
+    Pages through a user's reminders, formatting only the visible page.
+    '''
+    def __init__(self, ctx: commands.Context, user: ReminderList, until: int = None, contains: str = None, timezone: str = None, timeout: int = 180):
+        super().__init__(timeout=timeout)
+        self.ctx = ctx
+        self.user = user
+        self.until = until
+        self.timezone = timezone
+        self.contains = contains.lower() if contains else None
+        self.message: discord.Message = None
+
+        # start index of each visited page
+        self.cursors = [0]
+        self.page, self.next_cursor = self.get_page(0)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.ctx.author.id
+
+    async def on_timeout(self):
+        if self.message:
+            await self.message.edit(view=None)
+
+    @discord.ui.button(label="<", style=discord.ButtonStyle.green)
+    async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+
+        await self.update(interaction=interaction)
+
+    @discord.ui.button(label=">", style=discord.ButtonStyle.green)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.next_cursor != None:
+            self.cursors.append(self.next_cursor)
+
+        await self.update(interaction=interaction)
+
+    def get_page(self, cursor: int) -> tuple[list[tuple[int, dict]], int | None]:
+        '''
+        Returns the reminders on the page starting at `cursor` with their indexes, and the start of the next page.
+        '''
+        end = self.user.bisect(self.until) if self.until else len(self.user)
+
+        page, chars = [], 0
+        for i in range(min(cursor, end), end):
+            reminder = self.user[i]
+            if self.contains and self.contains not in reminder['task'].lower():
+                continue
+
+            # stop at the first reminder of the next page
+            chars += len(self.line(i, reminder))
+            if len(page) == PAGE_SIZE or chars > PAGE_CHARS:
+                return page, i
+
+            page.append((i, reminder))
+
+        return page, None
+
+    @staticmethod
+    def line(i: int, reminder: dict) -> str:
+        '''
+        Returns a reminder's line on a page, with long tasks shortened.
+        '''
+        line = f'`[{i+1}]` | **<t:{reminder["time"]}:R>**'
+        if reminder["task"] != "":
+            task = reminder["task"] if len(reminder["task"]) <= TASK_PREVIEW else reminder["task"][:TASK_PREVIEW] + "..."
+            line += " \u200b"*5 + f'**>** *{task}*'
+        return line + "\n"
+
+    def embed(self) -> discord.Embed:
+        if len(self.user) == 0:
+            description = "You have no reminders."
+        elif not self.page:
+            description = "No matching reminders."
+        else:
+            description = "".join(self.line(i, reminder) for i, reminder in self.page)
+
+        footer = f"Page {len(self.cursors)}"
+        if self.until:
+            footer += f" \u00B7 due before {local_time(self.until, self.timezone).strftime('%b %d, %I:%M %p')}"
+        if self.contains:
+            footer += f' \u00B7 containing "{self.contains[:TASK_PREVIEW]}"'
+
+        embed = discord.Embed(title="Your Reminders:", description=description)
+        embed.add_field(name="\t", value="`/info {index}` to get information about a reminder.\n`/rm {indexes}` to delete reminder(s).\n`/rm all` to delete all reminders.")
+        embed.set_author(name=self.ctx.author.display_name, icon_url=self.ctx.author.display_avatar)
+        embed.set_footer(text=footer)
+        return embed
 
-def date_hook(json_dict):
-    for (key, value) in json_dict.items():
-        if isinstance(value, str) and re.match(DATE_PATTERN, value):
-            json_dict[key] = datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S%z")
-    return json_dict
+    async def update(self, interaction: discord.Interaction):
+        self.page, self.next_cursor = self.get_page(self.cursors[-1])
+        await interaction.response.edit_message(embed=self.embed(), view=self)
 
 class ReminderCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
         # load reminders
-        try:
-            with open(JSON_PATH, 'r') as f:
-                self.db = json.load(f, object_hook=date_hook)
-        except FileNotFoundError:
-            self.db = {}
+        self.storage = ReminderDB(DB_PATH)
+        self.storage.migrate(JSON_PATH)
+
+        # load time zones
+        self.timezones = self.storage.timezones()
+
+        # collect reminders missed during downtime
+        now = timestamp()
+        self.overdue = self.storage.expired(now)
+        self.db = {id: ReminderList(reminders) for id, reminders in self.storage.load(now).items()}
 
-        # remove expired reminders
-        now = datetime.datetime.now(datetime.timezone.utc).astimezone()
+        # schedule reminders
+        self.scheduler = Scheduler()
         for id in self.db:
-            expired = [reminder for reminder in self.db[id] if reminder['time'] <= now]
-            for reminder in expired:
-                self.db[id].remove(reminder)
+            for reminder in self.db[id]:
+                self.scheduler.push(id, reminder)
 
-        # save reminders
-        with open(JSON_PATH, 'w') as f:
-            json.dump(self.db, f, indent=4, default=str)
+        # delivery
+        self.users = OrderedDict()
+        self.sends = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
 
         # start reminding
+        self.catch_up.start()
         self.remind.start()
+
+        # remove old delivered reminders
+        self.prune.start()
         
         print(f'cog: {self.qualified_name} loaded')
 
+    async def cog_unload(self):
+        self.catch_up.cancel()
+        self.remind.cancel()
+        self.prune.cancel()
+        self.storage.close()
+
     def add_user(self, id: int):
-        self.db[str(id)] = []
-        with open(JSON_PATH, 'w') as f:
-            json.dump(self.db, f, indent=4, default=str)
+        self.db[str(id)] = ReminderList()
 
     @commands.hybrid_command(brief='Set a reminder.', description='Set a reminder.')
     async def remindme(self, ctx: commands.Context, *, string: str = ""):
-        
+        await self.add_reminder(ctx, string)
+
+    @commands.hybrid_command(brief='Set a reminder for this channel.', description='Set a reminder that is posted in this channel. Mention a role to ping it, e.g. /remindhere in 2h raid @raiders')
+    @commands.guild_only()
+    async def remindhere(self, ctx: commands.Context, *, string: str = ""):
+
+        # check permissions
+        if not ctx.channel.permissions_for(ctx.guild.me).send_messages:
+            await error(ctx, "I cannot send messages in this channel.")
+            return
+
+        for role_id in ROLE_MENTION.findall(string):
+            role = ctx.guild.get_role(int(role_id))
+            if not role:
+                await error(ctx, "Role not found.")
+                return
+            if not role.mentionable and not ctx.author.guild_permissions.mention_everyone:
+                await error(ctx, f"You cannot mention {role.mention}.")
+                return
+
+        await self.add_reminder(ctx, string, channel=ctx.channel)
+
+    async def add_reminder(self, ctx: commands.Context, string: str, channel: discord.abc.GuildChannel = None):
+        '''
+        Parses and adds a reminder for the author, posted to `channel` if given, otherwise sent by DM.
+        '''
         id = ctx.author.id
-        now = ctx.message.created_at.astimezone().replace(microsecond=0)
+        now = local_time(round(ctx.message.created_at.timestamp()), self.timezones.get(str(id)))
         url = ctx.message.jump_url
 
         # add user if user not in database
@@ -63,13 +248,9 @@ class ReminderCog(commands.Cog):
 
         # parse reminder
         try:
-            time, task = parse_time(string)
+            time, task, repeat = parse_reminder(string, now)
         except:
-            examples = ("/remindme in 2h30m drink water\n"
-                        "/remindme at 5pm on sept 21\n"
-                        "/remindme thursday at 3:45 do laundry\n"
-                        "/remindme on january 6 2021 raid capitol\n"
-                        "/remindme tmr 8am kiss the homies\n")
+            examples = "".join(f"{example}\n" for example in EXAMPLES)
 
             units = ("```y : years | mo : months | w : weeks | d : days\n"
                      "h : hours | m : minutes | s : seconds```")
@@ -78,6 +259,7 @@ class ReminderCog(commands.Cog):
             embed.add_field(name="Pre (Optional)", value="in?\nat?\non?\non?", inline=True)
             embed.add_field(name="When (Required)", value="{amount}{units}\n{time}\n{month}{day}{year}?\n{weekday}", inline=True)
             embed.add_field(name="What (Optional)", value="{task}?\n{task}?\n{task}?\n{task}?", inline=True)
+            embed.add_field(name="Repeat (Optional)", value="every {amount}{units}\nevery day | week | month | year\nevery weekday | weekend\nevery {weekday}", inline=False)
             embed.add_field(name="Examples", value=examples, inline=False)
             embed.add_field(name="Units", value=units, inline=False)
             embed.set_footer(text=ctx.author.display_name, icon_url=ctx.author.display_avatar)
@@ -85,22 +267,28 @@ class ReminderCog(commands.Cog):
             await ctx.send(embed=embed)
             return
         
+        time, now = to_timestamp(time), to_timestamp(now)
+
         if time <= now:
             await error(ctx, "I cannot work backwards... maybe one day.")
             return
 
         # add reminder
-        user.append({'time': time, 'task': task, 'url': url, 'created': now, 'modified': now})
+        reminder = {'time': time, 'task': task, 'url': url, 'created': now, 'modified': now, 'repeat': repeat, 'channel': channel.id if channel else None,
+                    'anchor': time if repeat else None}
+        user.add(reminder)
+        self.scheduler.push(str(id), reminder)
 
-        # sort reminders by time
-        user = sorted(user, key=lambda x: x['time'])
-
-        # save reminders
-        with open(JSON_PATH, 'w') as f:
-            json.dump(self.db, f, indent=4, default=str)
+        # save reminder
+        self.storage.insert(id, reminder)
 
         # reply
-        reply = f'I will remind you **<t:{round(time.timestamp())}:R>**'
+        if channel:
+            reply = f'I will remind {channel.mention} **<t:{time}:R>**'
+        else:
+            reply = f'I will remind you **<t:{time}:R>**'
+        if repeat:
+            reply += f' and **{describe_repeat(repeat)}** after'
         if task != "":
             reply += f'\n> *{task}*'
 
@@ -109,8 +297,31 @@ class ReminderCog(commands.Cog):
 
         await ctx.send(embed=embed)
 
-    @commands.hybrid_command(brief='List your reminders.', description='List your reminders.')
-    async def reminders(self, ctx: commands.Context):
+    @commands.hybrid_group(fallback='list', invoke_without_command=True, brief='List your reminders.', description='List your reminders. Optionally only those due within {time} and/or containing {text}.')
+    async def reminders(self, ctx: commands.Context, within: str = None, *, contains: str = None):
+
+        id = ctx.author.id
+
+        # add user if user not in database
+        if str(id) not in self.db:
+            self.add_user(id)
+
+        user = self.db[str(id)]
+
+        # parse filter, a text-only filter is all contains
+        until = None
+        if within:
+            if (delta := match_timedelta(within)) and not delta[1]:
+                until = to_timestamp(local_time(timestamp(), self.timezones.get(str(id))) + delta[0])
+            else:
+                contains = f"{within} {contains}" if contains else within
+
+        view = ReminderPaginationView(ctx=ctx, user=user, until=until, contains=contains, timezone=self.timezones.get(str(id)))
+        message = await ctx.send(embed=view.embed(), view=view if view.next_cursor != None else None)
+        view.message = message
+
+    @reminders.command(name='export', brief='Export your reminders.', description='Export your reminders as an iCalendar (.ics) file.')
+    async def export_reminders(self, ctx: commands.Context):
 
         id = ctx.author.id
 
@@ -120,20 +331,89 @@ class ReminderCog(commands.Cog):
 
         user = self.db[str(id)]
 
-        # reply
         if len(user) == 0:
-            embed = discord.Embed(title="Your Reminders:", description="You have no reminders.")
-        else:
-            description = ""
-            for i, reminder in enumerate(user):
-                description += f'`[{i+1}]` | **<t:{round(reminder["time"].timestamp())}:R>**\n'
-                if reminder["task"] != "":
-                    description = description[:-1] + " \u200b"*5 + f'**>** *{reminder["task"]}*\n'
+            await error(ctx, "You have no reminders.")
+            return
 
-            embed = discord.Embed(title="Your Reminders:", description=description)
+        # write calendar
+        buffer = io.BytesIO()
+        buffer.writelines(to_ics(user))
+        buffer.seek(0)
 
-        embed.add_field(name="\t", value="`/info {index}` to get information about a reminder.\n`/rm {indexes}` to delete reminder(s).\n`/rm all` to delete all reminders.")
-        embed.set_author(name=ctx.author.display_name, icon_url=ctx.author.display_avatar)
+        embed = discord.Embed(title="Reminders Exported", description=f'Exported **{len(user)}** reminder(s).')
+        embed.set_footer(text=f"{ctx.author.display_name} \u00B7 /reminders import to import reminders", icon_url=ctx.author.display_avatar)
+
+        await ctx.send(embed=embed, file=discord.File(buffer, filename="reminders.ics"))
+
+    @reminders.command(name='import', brief='Import reminders.', description='Import reminders from an iCalendar (.ics) file.')
+    async def import_reminders(self, ctx: commands.Context, file: discord.Attachment):
+
+        id = ctx.author.id
+        now = round(ctx.message.created_at.timestamp())
+        url = ctx.message.jump_url
+        timezone = self.timezones.get(str(id))
+
+        # add user if user not in database
+        if str(id) not in self.db:
+            self.add_user(id)
+
+        user = self.db[str(id)]
+
+        # read calendar
+        try:
+            data = await file.read()
+        except discord.HTTPException:
+            await error(ctx, "Could not read the file.")
+            return
+
+        def parse():
+            reminders, skipped = [], 0
+
+            for event in from_ics(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', errors='replace', newline=''), timezone):
+                # series that end are added as their remaining occurrences, ended series are skipped
+                if event['repeat'] and (event['until'] != None or event['count'] != None):
+                    if not (times := expand_series(event['repeat'], event['time'], now, event['until'], event['count'], timezone)):
+                        skipped += 1
+                    for time in times:
+                        reminders.append({'time': time, 'task': event['task'], 'url': event['url'] or url,
+                                          'created': now, 'modified': now, 'repeat': None, 'channel': None, 'anchor': None})
+                    continue
+
+                # move past recurring events to their next occurrence
+                anchor = event['time'] if event['repeat'] else None
+                if event['time'] <= now and event['repeat']:
+                    event['time'] = to_timestamp(next_occurrence(event['repeat'], local_time(event['time'], timezone), local_time(now, timezone)))
+
+                if event['time'] <= now:
+                    skipped += 1
+                    continue
+
+                reminders.append({'time': event['time'], 'task': event['task'], 'url': event['url'] or url,
+                                  'created': now, 'modified': now, 'repeat': event['repeat'], 'channel': None, 'anchor': anchor})
+
+            return reminders, skipped
+
+        reminders, skipped = await asyncio.to_thread(parse)
+
+        if not reminders:
+            await error(ctx, "No upcoming reminders found.")
+            return
+
+        # save reminders
+        self.storage.insert_many(id, reminders)
+
+        # add reminders
+        user.extend(reminders)
+        for reminder in reminders:
+            self.scheduler.push(str(id), reminder)
+
+        # reply
+        reply = f'Imported **{len(reminders)}** reminder(s).'
+        if skipped:
+            reply += f'\nSkipped **{skipped}** past event(s).'
+
+        embed = discord.Embed(title="Reminders Imported", description=reply)
+        embed.set_footer(text=f"{ctx.author.display_name} \u00B7 /reminders to list your reminders", icon_url=ctx.author.display_avatar)
 
         await ctx.send(embed=embed)
 
@@ -141,7 +421,7 @@ class ReminderCog(commands.Cog):
     async def info(self, ctx: commands.Context, index: int = None):
 
         id = ctx.author.id
-        now = ctx.message.created_at.astimezone().replace(microsecond=0)
+        now = round(ctx.message.created_at.timestamp())
 
         # add user if user not in database
         if str(id) not in self.db:
@@ -156,16 +436,16 @@ class ReminderCog(commands.Cog):
         
         # get recent
         if index == None:
-            recent = sorted(user, key=lambda x: x['modified'])[-1]
+            recent = user.recent
 
-            if now - recent['modified'] < timedelta(minutes=3):
+            if now - recent['modified'] < timedelta(minutes=3).total_seconds():
                 index = user.index(recent) + 1
             else:
                 await error(ctx, "Reminder not found.")
                 return 
         
         # if invalid index
-        elif abs(index) > len(user):
+        elif not 0 < abs(index) <= len(user):
             await error(ctx, "Invalid index.")
             return
         
@@ -173,14 +453,15 @@ class ReminderCog(commands.Cog):
         reminder = user[abs(index)-1]
 
         # update modified
-        user[abs(index)-1]['modified'] = now
+        reminder['modified'] = now
+        user.touch(reminder)
         
-        # save reminders
-        with open(JSON_PATH, 'w') as f:
-            json.dump(self.db, f, indent=4, default=str)
+        # save reminder
+        self.storage.touch(reminder)
 
         # reply
-        reply = f'on **{reminder["time"].strftime("%b %d, %Y")}** at **{reminder["time"].strftime("%I:%M %p")}** \u00B7 <t:{round(reminder["time"].timestamp())}:R>\n'
+        time = local_time(reminder['time'], self.timezones.get(str(id)))
+        reply = f'on **{time.strftime("%b %d, %Y")}** at **{time.strftime("%I:%M %p")}** \u00B7 <t:{reminder["time"]}:R>\n'
 
         if reminder['task'] != "":
             reply += f'> *{reminder["task"]}*\n'
@@ -188,9 +469,13 @@ class ReminderCog(commands.Cog):
             reply += f'> *<empty>*\n'
 
         reply += f'\n**ID**: `[{abs(index)}]`'
+        if reminder['repeat']:
+            reply += f' \u00B7 **Repeats**: {describe_repeat(reminder["repeat"])}'
         
         embed = discord.Embed(title="Reminder", description=reply)
-        embed.add_field(name="Created", value=f'<t:{round(reminder["created"].timestamp())}:R>', inline=False)
+        if reminder['channel']:
+            embed.add_field(name="Channel", value=f'<#{reminder["channel"]}>', inline=False)
+        embed.add_field(name="Created", value=f'<t:{reminder["created"]}:R>', inline=False)
         embed.add_field(name="Original Message", value=reminder['url'], inline=False)
         embed.set_footer(text=f'{ctx.author.display_name} \u00B7 /rm to delete this reminder', icon_url=ctx.author.display_avatar) 
 
@@ -200,7 +485,7 @@ class ReminderCog(commands.Cog):
     async def rm(self, ctx: commands.Context, *, indexes: str = None):
 
         id = ctx.author.id
-        now = ctx.message.created_at.astimezone().replace(microsecond=0)
+        now = round(ctx.message.created_at.timestamp())
 
         # add user if user not in database
         if str(id) not in self.db:
@@ -215,9 +500,9 @@ class ReminderCog(commands.Cog):
         
         # delete recent
         if indexes == None:
-            recent = sorted(user, key=lambda x: x['modified'])[-1]
+            recent = user.recent
 
-            if now - recent['modified'] < timedelta(minutes=3):
+            if now - recent['modified'] < timedelta(minutes=3).total_seconds():
                 indexes = [user.index(recent) + 1]
             else:
                 await error(ctx, "Reminder not found.")
@@ -229,8 +514,7 @@ class ReminderCog(commands.Cog):
 
         # delete indexed
         elif matched := re.findall(r"\d+", indexes):
-            indexes = [int(i) for i in matched if int(i) <= len(user)]
-            indexes.sort()
+            indexes = sorted(set(int(i) for i in matched if 0 < int(i) <= len(user)))
 
         # if invalid index
         else:
@@ -241,21 +525,18 @@ class ReminderCog(commands.Cog):
             await error(ctx, "Invalid index.")
             return
         
-        # get reminders
-        reminders = [user[(i-1)] for i in indexes]
-        
         # delete reminders
+        reminders = user.pop([i-1 for i in indexes])
         for reminder in reminders:
-            user.remove(reminder)
+            self.scheduler.remove(reminder)
 
         # save reminders
-        with open(JSON_PATH, 'w') as f:
-            json.dump(self.db, f, indent=4, default=str)
+        self.storage.delete(reminders)
 
         # reply
         description = ""
         for i, reminder in zip(indexes,reminders):
-            description += f'> `[{i}]` | **<t:{round(reminder["time"].timestamp())}:R>**\n'
+            description += f'> `[{i}]` | **<t:{reminder["time"]}:R>**\n'
             if reminder["task"] != "":
                 description = description[:-1] + " \u200b"*5 + f'**>** *{reminder["task"]}*\n'
 
@@ -264,38 +545,281 @@ class ReminderCog(commands.Cog):
 
         await ctx.send(embed=embed)
 
-    @tasks.loop(seconds=5)
+    @commands.hybrid_command(brief='Set your time zone.', description='Set your time zone, e.g. America/New_York. /timezone to see your current time zone.')
+    async def timezone(self, ctx: commands.Context, timezone: str = None):
+
+        id = ctx.author.id
+
+        # show time zone
+        if timezone == None:
+            current = self.timezones.get(str(id))
+            now = local_time(timestamp(), current)
+
+            reply = f'Your time zone is **{current or "not set"}**\nIt is **{now.strftime("%I:%M %p")}** on **{now.strftime("%b %d, %Y")}**'
+
+        # set time zone
+        else:
+            timezone = next((name for name in get_zone_names() if name.lower() == timezone.strip().lower()), timezone.strip())
+
+            try:
+                now = local_time(timestamp(), timezone)
+            except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+                await error(ctx, "Unknown time zone.\nTime zone must be an IANA name, e.g. America/New_York.")
+                return
+
+            self.timezones[str(id)] = timezone
+
+            # save time zone
+            self.storage.set_timezone(id, timezone)
+
+            reply = f'Your time zone is now **{timezone}**\nIt is **{now.strftime("%I:%M %p")}** on **{now.strftime("%b %d, %Y")}**'
+
+        embed = discord.Embed(title="Time Zone", description=reply)
+        embed.set_footer(text=ctx.author.display_name, icon_url=ctx.author.display_avatar)
+
+        await ctx.send(embed=embed)
+
+    @timezone.autocomplete('timezone')
+    async def timezone_autocomplete(self, interaction: discord.Interaction, current: str) -> list[discord.app_commands.Choice[str]]:
+        current = current.lower()
+        return [discord.app_commands.Choice(name=name, value=name) for name in get_zone_names() if current in name.lower()][:25]
+
+    @tasks.loop()
     async def remind(self):
-        now = datetime.datetime.now(datetime.timezone.utc).astimezone()
+        # sleep until the earliest reminder is due
+        await self.scheduler.wait()
 
-        # reminders are sorted by time
-        # for each user, check top reminder
-        for id in self.db:
-            if len(self.db[id]) == 0:
-                pass
-            else:
-                reminder = self.db[id][0]
+        now = timestamp()
 
-                if reminder['time'] <= now:
-                    author = await self.bot.fetch_user(int(id))
+        if not (due := self.scheduler.pop_due(now)):
+            return
+
+        # remove reminders
+        for id, reminder in due:
+            self.db[id].remove(reminder)
+
+        # send reminders, channel reminders due in the same tick are combined into one message per channel
+        channels = {}
+        for id, reminder in due:
+            if reminder['channel']:
+                channels.setdefault(reminder['channel'], []).append((id, reminder))
+
+        lateness = await asyncio.gather(*[self.deliver(id, reminder) for id, reminder in due if not reminder['channel']],
+                                        *[self.deliver_channel(channel, reminders) for channel, reminders in channels.items()])
+
+        # reschedule recurring reminders
+        now = timestamp()
+        recurring = [(id, reminder) for id, reminder in due if reminder['repeat']]
+        for id, reminder in recurring:
+            timezone = self.timezones.get(id)
+            reminder['time'] = to_timestamp(next_occurrence(reminder['repeat'], local_time(reminder['time'], timezone), local_time(now, timezone),
+                                                            local_time(reminder.get('anchor') or reminder['time'], timezone)))
+            self.db[id].add(reminder)
+            self.scheduler.push(id, reminder)
+
+        # save reminders
+        self.storage.reschedule([reminder for _, reminder in recurring])
+        self.storage.archive([reminder for _, reminder in due if not reminder['repeat']], now)
 
+        print(f'reminders: delivered {len(due)} (max {max(lateness):.1f}s late)')
+
+    async def deliver(self, id: str, reminder: dict) -> float:
+        '''
+        Sends a reminder to its user.
+
+        Returns the number of seconds the reminder was delivered late.
+        '''
+        # bound concurrent sends, discord.py queues each request on its route's rate limit bucket
+        async with self.sends:
+            try:
+                author = await self.get_user(int(id))
+
+                if reminder['task'] != "":
+                    embed = discord.Embed(title="Reminder", description=f'> *{reminder["task"]}*', timestamp=datetime.datetime.fromtimestamp(reminder["created"], datetime.timezone.utc))
+                else:
+                    embed = discord.Embed(title="Reminder", timestamp=datetime.datetime.fromtimestamp(reminder["created"], datetime.timezone.utc))
+
+                embed.add_field(name="Original Message", value=reminder['url'])
+                if reminder['repeat']:
+                    embed.add_field(name="Repeats", value=describe_repeat(reminder['repeat']))
+                embed.set_footer(text=f'{author.display_name}', icon_url=author.display_avatar)
+
+                # send reminder
+                await author.send(embed=embed, view=reminder_buttons(reminder))
+
+            except discord.HTTPException as e:
+                print(f'reminders: failed to remind {id} ({e})')
+
+        return timestamp() - reminder['time']
+
+    async def deliver_channel(self, id: int, reminders: list[tuple[str, dict]]) -> float:
+        '''
+        Posts channel reminders in one message, mentioning their authors and roles.
+
+        Returns the number of seconds the earliest reminder was delivered late.
+        '''
+        async with self.sends:
+            try:
+                channel = self.bot.get_channel(id) or await self.bot.fetch_channel(id)
+
+                # authors and roles to mention, in order
+                users = list(dict.fromkeys(int(user_id) for user_id, _ in reminders))
+                roles = list(dict.fromkeys(int(role_id) for _, reminder in reminders for role_id in ROLE_MENTION.findall(reminder['task'])))
+
+                description = ""
+                for i, (user_id, reminder) in enumerate(reminders):
+                    line = f'<@{user_id}> \u00B7 [message]({reminder["url"]})'
                     if reminder['task'] != "":
-                        embed = discord.Embed(title="Reminder", description=f'> *{reminder["task"]}*', timestamp=reminder["created"])
-                    else:
-                        embed = discord.Embed(title="Reminder", timestamp=reminder["created"])
+                        line += " \u200b"*5 + f'**>** *{reminder["task"]}*'
+
+                    # embed descriptions are limited to 4096 characters
+                    if len(description) + len(line) > 4000:
+                        description += f'*...and {len(reminders) - i} more*'
+                        break
+
+                    description += line + "\n"
+
+                # mentions in embeds do not ping, so they are sent as content
+                content = " ".join([f'<@{user_id}>' for user_id in users] + [f'<@&{role_id}>' for role_id in roles])
+                mentions = discord.AllowedMentions(everyone=False, users=[discord.Object(i) for i in users], roles=[discord.Object(i) for i in roles])
+
+                embed = discord.Embed(title="Reminder" if len(reminders) == 1 else "Reminders", description=description)
+
+                # send reminders
+                await channel.send(content=content, embed=embed, allowed_mentions=mentions)
+
+            except discord.HTTPException as e:
+                print(f'reminders: failed to remind channel {id} ({e})')
+
+        return timestamp() - min(reminder['time'] for _, reminder in reminders)
 
-                    embed.add_field(name="Original Message", value=reminder['url'])
-                    embed.set_footer(text=f'{author.display_name}', icon_url=author.display_avatar)
+    @tasks.loop(hours=24)
+    async def prune(self):
+        '''
+        Deletes reminders delivered more than ARCHIVE_DAYS ago, which can no longer be snoozed.
+        '''
+        self.storage.prune(timestamp() - timedelta(days=ARCHIVE_DAYS).total_seconds())
 
-                    # send reminder
-                    await author.send(embed=embed)
+    @tasks.loop(count=1)
+    async def catch_up(self):
+        if not self.overdue:
+            return
+
+        queue = asyncio.Queue()
+        for id, reminders in self.overdue.items():
+            queue.put_nowait((id, reminders))
+
+        # each worker sends at most one digest per CATCH_UP_DELAY
+        async def worker():
+            while not queue.empty():
+                await self.send_digest(*queue.get_nowait())
+                await asyncio.sleep(CATCH_UP_DELAY)
+
+        await asyncio.gather(*[worker() for _ in range(MAX_CONCURRENT_SENDS)])
+
+        # delete reminders, recurring reminders were already rescheduled
+        reminders = [reminder for id in self.overdue for reminder in self.overdue[id]]
+        self.storage.delete([reminder for reminder in reminders if not reminder['repeat']])
+        self.overdue = {}
 
-                    # delete reminder
-                    self.db[id].remove(reminder)
+        print(f'reminders: caught up on {len(reminders)} missed reminders')
 
-                    # save reminders
-                    with open(JSON_PATH, 'w') as f:
-                        json.dump(self.db, f, indent=4, default=str)
+    @catch_up.before_loop
+    async def before_catch_up(self):
+        await self.bot.wait_until_ready()
+
+    async def send_digest(self, id: str, reminders: list[dict]):
+        '''
+        Sends a user every reminder they missed in one message.
+        '''
+        try:
+            author = await self.get_user(int(id))
+
+            description = ""
+            for i, reminder in enumerate(reminders):
+                line = f'**<t:{reminder["time"]}:R>** \u00B7 [message]({reminder["url"]})'
+                if reminder["channel"]:
+                    line += f' \u00B7 <#{reminder["channel"]}>'
+                if reminder["task"] != "":
+                    line += " \u200b"*5 + f'**>** *{reminder["task"]}*'
+
+                # embed descriptions are limited to 4096 characters
+                if len(description) + len(line) > 4000:
+                    description += f'*...and {len(reminders) - i} more*'
+                    break
+
+                description += line + "\n"
+
+            embed = discord.Embed(title="Missed Reminders", description=description)
+            embed.set_footer(text=f'{author.display_name} \u00B7 these were due while I was offline', icon_url=author.display_avatar)
+
+            await author.send(embed=embed)
+
+        except discord.HTTPException as e:
+            print(f'reminders: failed to remind {id} ({e})')
+
+    async def snooze(self, interaction: discord.Interaction, action: str, id: int):
+        '''
+        Handles the Snooze/Done buttons of a delivered reminder.
+        '''
+        now = local_time(round(timestamp()), self.timezones.get(str(interaction.user.id)))
+
+        if not (row := self.storage.get(id)) or row[0] != str(interaction.user.id):
+            await interaction.response.edit_message(view=None)
+            await interaction.followup.send(embed=discord.Embed(title="Woops...", description="Reminder not found."))
+            return
+
+        user_id, reminder, delivered = row
+
+        # remove buttons
+        await interaction.response.edit_message(view=None)
+
+        if action == 'done':
+            if delivered:
+                self.storage.delete([reminder])
+            return
+
+        if user_id not in self.db:
+            self.add_user(user_id)
+
+        time, now = to_timestamp(add_interval(now, SNOOZE[action][1])), to_timestamp(now)
+
+        if delivered:
+            reminder['time'] = time
+            reminder['modified'] = now
+            self.storage.restore(reminder)
+
+        # snooze a copy of recurring reminders
+        else:
+            reminder = {'time': time, 'task': reminder['task'], 'url': reminder['url'], 'created': reminder['created'], 'modified': now, 'repeat': None, 'channel': reminder['channel'], 'anchor': None}
+            self.storage.insert(user_id, reminder)
+
+        self.db[user_id].add(reminder)
+        self.scheduler.push(user_id, reminder)
+
+        embed = discord.Embed(title="Reminder Snoozed", description=f'I will remind you again **<t:{reminder["time"]}:R>**')
+        embed.set_footer(text=f"{interaction.user.display_name} \u00B7 /rm to delete this reminder", icon_url=interaction.user.display_avatar)
+
+        await interaction.followup.send(embed=embed)
+
+    async def get_user(self, id: int) -> discord.User:
+        '''
+        Gets a user from the client cache, falling back to a bounded cache of fetched users.
+        '''
+        if user := self.bot.get_user(id):
+            return user
+        
+        if user := self.users.get(id):
+            self.users.move_to_end(id)
+            return user
+        
+        user = await self.bot.fetch_user(id)
+
+        self.users[id] = user
+        if len(self.users) > MAX_CACHED_USERS:
+            self.users.popitem(last=False)
+
+        return user
 
     @remind.before_loop
     async def before_remind(self):
@@ -307,5 +831,9 @@ async def error(ctx: commands.Context, description: str):
     await ctx.send(embed=embed)
 
 async def setup(bot: commands.Bot):
+    bot.add_dynamic_items(ReminderButton)
     await bot.add_cog(ReminderCog(bot))
+
+async def teardown(bot: commands.Bot):
+    bot.remove_dynamic_items(ReminderButton)
     
\ No newline at end of file
@@ -1,22 +1,68 @@
-import os
+import io
 import re
 import json
-import requests
+import math
+import asyncio
 import urllib.parse
+from collections import OrderedDict, deque
+from typing import Literal, Optional
 from datetime import timedelta
 import modules.riot_tools as riot
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 JSON_PATH = "json/summoners.json"
+STANDINGS_PATH = "json/standings.json"
+
+# splash images kept in memory per /splash message
+SPLASH_CACHE_SIZE = 5
+
+# summoner fields shown in profiles, saved when they change
+PROFILE_FIELDS = ('gameName', 'tagLine', 'profileIconId', 'summonerLevel')
+
+# send /summoner's header first and edit in each section as it loads
+PROGRESSIVE_EMBED = False
+
+# registered members' ranks are refreshed in the background using this share of the league-v4 rate limit,
+# one member at a time but no member more often than every LEADERBOARD_CYCLE seconds
+LEADERBOARD_SHARE = 0.1
+LEADERBOARD_CYCLE = 10 * 60
+LEADERBOARD_MIN_INTERVAL = 1
+LEADERBOARD_PAGE_SIZE = 10
+
+# /stats games limit, rolling average window and rows per breakdown
+STATS_MAX_GAMES = 500
+STATS_WINDOW = 10
+STATS_ROWS = 5
+# seconds between /stats edits while uncached games load in the background
+STATS_UPDATE_INTERVAL = 10
+# seconds before /stats stops loading, well within the 15 minutes a slash command response stays editable
+STATS_MAX_LOAD = 12 * 60
+
+# teamPosition -> role
+POSITIONS = {'TOP': "Top", 'JUNGLE': "Jungle", 'MIDDLE': "Mid", 'BOTTOM': "Bot", 'UTILITY': "Support"}
 
 class PaginationView(discord.ui.View):
+    '''
+    Pages through a champion's skins.
+
+    Splash images are kept in memory, the neighbors of the current skin are prefetched while it is shown.
+    '''
     def __init__(self, skins: list, timeout: int = 180):
         super().__init__(timeout=timeout)
         self.index = 0
         self.skins = skins
 
+        # skin index -> image bytes, least recently used first
+        self.images: OrderedDict[int, bytes] = OrderedDict()
+        # skin index -> download in flight
+        self.pending: dict[int, asyncio.Task] = {}
+
+    async def on_timeout(self):
+        for task in self.pending.values():
+            task.cancel()
+
     @discord.ui.button(label="<", style=discord.ButtonStyle.green)
     async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.index > 0:
@@ -36,24 +82,80 @@ class PaginationView(discord.ui.View):
         await self.update_img(interaction=interaction)
 
     async def update_img(self, interaction: discord.Interaction):
-        if not (img_data := requests.get(self.skins[self.index]['url']).content):
-            raise Exception("Failed to get image.")
+        embed, file = await self.render()
 
-        img_name = self.skins[self.index]['url'].split("/")[-1]
+        await interaction.response.edit_message(embed=embed, attachments=[file] if file else [])
 
-        with open("downloads/" + img_name, "wb") as handler:
-            handler.write(img_data)
+    async def render(self) -> tuple[discord.Embed, discord.File | None]:
+        '''
+        Returns the embed and image attachment of the current skin, then prefetches its neighbors.
+        '''
+        skin = self.skins[self.index]
 
-        file = discord.File(fp="downloads/" + img_name)
-
-        embed = discord.Embed(title=self.skins[self.index]['name'].title(), description="\t")
-        embed.set_image(url="attachment://" + img_name)
+        embed = discord.Embed(title=skin['name'].title(), description="\t")
         embed.set_footer(text=f"{self.index + 1}/{len(self.skins)}")
 
-        await interaction.response.edit_message(embed=embed, attachments=[file])
+        # fall back to the CDN link if the download failed
+        file = None
+        if img_data := await self.get_image(self.index):
+            img_name = f"{skin['champion']}_{skin['num']}.webp"
+            file = discord.File(io.BytesIO(img_data), filename=img_name)
+            embed.set_image(url="attachment://" + img_name)
+        else:
+            embed.set_image(url=skin['url'])
+
+        for index in ((self.index + 1) % len(self.skins), (self.index - 1) % len(self.skins)):
+            if index not in self.images and index not in self.pending:
+                self.pending[index] = asyncio.create_task(self.get_image(index))
+
+        return embed, file
 
-        file.close()
-        os.remove("downloads/" + img_name)
+    async def get_image(self, index: int) -> bytes | None:
+        '''
+        Returns a skin's splash image, downloading it if it is not cached.
+        '''
+        if index in self.images:
+            self.images.move_to_end(index)
+            return self.images[index]
+
+        # join a prefetch in flight
+        if (task := self.pending.get(index)) and task is not asyncio.current_task():
+            return await task
+
+        try:
+            if img_data := await riot.get_splash(self.skins[index]):
+                self.images[index] = img_data
+                if len(self.images) > SPLASH_CACHE_SIZE:
+                    self.images.popitem(last=False)
+            return img_data
+        finally:
+            if self.pending.get(index) is asyncio.current_task():
+                del self.pending[index]
+
+class LeaderboardView(discord.ui.View):
+    '''
+    Pages through a leaderboard.
+    '''
+    def __init__(self, title: str, rows: list[str], page_size: int = LEADERBOARD_PAGE_SIZE, timeout: int = 180):
+        super().__init__(timeout=timeout)
+        self.page = 0
+        self.title = title
+        self.pages = [rows[i:i + page_size] for i in range(0, len(rows), page_size)]
+
+    @discord.ui.button(label="<", style=discord.ButtonStyle.green)
+    async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = (self.page - 1) % len(self.pages)
+        await interaction.response.edit_message(embed=self.render())
+
+    @discord.ui.button(label=">", style=discord.ButtonStyle.green)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = (self.page + 1) % len(self.pages)
+        await interaction.response.edit_message(embed=self.render())
+
+    def render(self) -> discord.Embed:
+        embed = discord.Embed(title=self.title, description="\n".join(self.pages[self.page]))
+        embed.set_footer(text=f"{self.page + 1}/{len(self.pages)}")
+        return embed
 
 class RiotCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
@@ -66,8 +168,121 @@ class RiotCog(commands.Cog):
         except FileNotFoundError:
             self.db = {}
 
+        # keep registered profiles up to date
+        riot.summoners.on_update = self.update_summoner
+
+        # queue -> standings of registered members by Discord ID, seeded with the last saved ranks
+        self.standings = {queue: riot.Standings() for queue in riot.QUEUES}
+        try:
+            with open(STANDINGS_PATH, 'r') as f:
+                for queue, entries in json.load(f).items():
+                    for id, entry in entries.items():
+                        if queue in self.standings and id in self.db:
+                            self.standings[queue].update(id, entry)
+        except FileNotFoundError:
+            pass
+
+        # Discord IDs waiting for a rank refresh
+        self.rotation: deque[str] = deque()
+        self.batch = 1
+        self.update_standings.start()
+
+        # check for new Data Dragon versions
+        self.update_ddragon.start()
+
         print(f"cog: {self.qualified_name} loaded")
 
+    async def cog_unload(self):
+        riot.summoners.on_update = None
+        self.update_ddragon.cancel()
+        self.update_standings.cancel()
+        await riot.close()
+
+    def save(self):
+        with open(JSON_PATH, 'w') as f:
+            json.dump(self.db, f, indent=4, default=str)
+
+    def save_standings(self):
+        with open(STANDINGS_PATH, 'w') as f:
+            json.dump({queue: standings.entries for queue, standings in self.standings.items()}, f, indent=4)
+
+    def update_summoner(self, summoner: dict):
+        '''
+        Saves a registered summoner whose profile changed.
+        '''
+        changed = False
+        for id, registered in self.db.items():
+            if registered['puuid'] == summoner['puuid'] and any(registered.get(field) != summoner.get(field) for field in PROFILE_FIELDS):
+                self.db[id] = summoner
+                changed = True
+
+        if changed:
+            self.save()
+
+    @tasks.loop(hours=1)
+    async def update_ddragon(self):
+        version = riot.ddragon.version
+
+        if await riot.ddragon.update() and riot.ddragon.version != version:
+            print(f"riot: loaded Data Dragon {riot.ddragon.version}")
+
+    @tasks.loop(seconds=LEADERBOARD_CYCLE)
+    async def update_standings(self):
+        '''
+        Refreshes the ranks of the next registered members, cycling through all of them at a pace the rate limits allow.
+        '''
+        self.pace_standings()
+
+        if not self.rotation:
+            self.rotation.extend(self.db)
+
+        ids = [self.rotation.popleft() for _ in range(min(self.batch, len(self.rotation)))]
+        changed = False
+
+        # forget unregistered members
+        for id in [id for id in ids if id not in self.db]:
+            for standings in self.standings.values():
+                changed |= id in standings.entries
+                standings.update(id, None)
+        ids = [id for id in ids if id in self.db]
+
+        async def fetch(id: str) -> list[dict] | None:
+            return await riot.get_stats_by_summoner(self.db[id]['id'])
+
+        # an exception would stop the loop for good
+        with riot.background():
+            results = await asyncio.gather(*[fetch(id) for id in ids], return_exceptions=True)
+
+        for id, stats in zip(ids, results):
+            if isinstance(stats, Exception):
+                print(f"riot: failed to refresh rank of {id} ({stats!r})")
+                continue
+            # keep the last known rank if the request failed
+            if stats == None:
+                continue
+            for queue, standings in self.standings.items():
+                entry = riot.get_queue_entry(stats, queue)
+                changed |= standings.entries.get(id) != entry
+                standings.update(id, entry)
+
+        if changed:
+            self.save_standings()
+
+    def pace_standings(self):
+        '''
+        Sets the members refreshed per tick and the time between ticks.\n
+        Refreshes use LEADERBOARD_SHARE of the league-v4 limits the rate limiter has learned, spread evenly over time,
+        and slow down so a full cycle takes at least LEADERBOARD_CYCLE seconds.
+        '''
+        interval = max(1 / (LEADERBOARD_SHARE * riot.get_rate(riot.NA_URL, "league-v4.by-summoner")), LEADERBOARD_CYCLE / max(len(self.db), 1))
+
+        # batch members when the budget allows more than one refresh per LEADERBOARD_MIN_INTERVAL
+        self.batch = max(1, math.floor(LEADERBOARD_MIN_INTERVAL / interval))
+        interval *= self.batch
+
+        if interval != self.update_standings.seconds:
+            self.update_standings.change_interval(seconds=interval)
+
     @commands.hybrid_command(brief="Register your LoL account.", description="Register your LoL account.")
     async def register(self, ctx: commands.Context, *, riot_id: str):
         riot_id = riot_id.split("#")
@@ -76,15 +291,17 @@ class RiotCog(commands.Cog):
             await error(ctx, "Invalid Riot ID.\nRiot ID must be in the form {gameName}#{tagLine}.")
             return
 
-        if not (summoner := riot.get_summoner_by_name(riot_id[0], riot_id[1])):
+        if not (summoner := await riot.summoners.get_by_name(riot_id[0], riot_id[1])):
             await error(ctx, "Account not found.")
             return
 
         self.db[str(ctx.author.id)] = summoner
 
         # save account
-        with open(JSON_PATH, 'w') as f:
-            json.dump(self.db, f, indent=4, default=str)
+        self.save()
+
+        # rank the account on the next tick
+        self.rotation.appendleft(str(ctx.author.id))
 
         await self.summoner(ctx)
 
@@ -97,64 +314,134 @@ class RiotCog(commands.Cog):
         async with ctx.channel.typing():
             summoner, member = tupl
 
-            opgg_url = f"https://www.op.gg/summoners/na/{urllib.parse.quote(summoner['gameName'] + '-' + summoner['tagLine'])}"
-
-            embed = discord.Embed(title=f"{summoner['gameName']} #{summoner['tagLine']}", description=f"**Level:** `{summoner['summonerLevel']}`" + " \u200b"*5 + f"**[OP.GG]({opgg_url})**")
-            embed.set_thumbnail(url=riot.get_summoner_icon(summoner['profileIconId']))
-            if member:
-                embed.set_author(name=member.display_name, icon_url=member.display_avatar)
-
-            # get ranked stats
-            if stats := riot.get_stats_by_summoner(summoner['id']):
-                for entry in [entry for entry in stats if "leagueId" in entry]:
-                    embed.add_field(name=" ".join(entry['queueType'].split("_")[:-1]).title(), value=f"{entry['tier'].title()} {entry['rank']} `({entry['wins']}W|{entry['losses']}L)`")
-
-            # get champion stats
-            if masteries := riot.get_champion_masteries_by_puuid(summoner['puuid'], 3):
-                for i, mastery in enumerate(masteries):
-                    if not (champion := riot.get_champion_by_id(mastery['championId'])):
-                        continue
-                    if i == 0:
-                        embed.add_field(name="\t", value="\t", inline=False)
-                        embed.add_field(name="Highest Champion Mastery", value="\t", inline=False)
-
-                    embed.add_field(name=champion['name'], value=f"Level: `{mastery['championLevel']}`\nPoints: `{mastery['championPoints']}`", inline=True)
-            
-            # get recent games
-            if matchId := riot.get_matchId_by_puuid(summoner['puuid'], 3):
-                def win_str(win: bool):
-                    if win: return "\u001b[0;34m[W]\u001b[0;0m"
-                    return "\u001b[0;31m[L]\u001b[0;0m"
-                
-                def time_str(duration: int):
-                    return f"{str(timedelta(seconds=duration)).lstrip(':0')}"
-                
-                def pos_str(position: str):
-                    if not position: return ""
-                    if position == "UTILITY": return " (Support)"
-                    return f" ({position.title()})"
-                
-                matches = list(filter(None, [riot.get_match_by_id(id) for id in matchId]))
-                value = ""
-                for matchDto in matches:
-                    infoDto = matchDto['info']
-                    participantDto = [participantDto for participantDto in infoDto['participants'] if participantDto['puuid'] == summoner['puuid']][0]
-                    teamDto = [teamDto for teamDto in infoDto['teams'] if teamDto['teamId'] == participantDto['teamId']][0]
-
-                    value += f"<t:{str(infoDto['gameCreation'] + infoDto['gameDuration']*1000)[:-3]}:R>\n"                                                                                  # {timestamp}
-                    value += f"```ansi\n{win_str(participantDto['win'])} {infoDto['gameMode']} | "                                                                                          # {win/loss} {gamemode}
-                    value += f"{participantDto['championName']}{pos_str(participantDto['teamPosition'])} | "                                                                                # {champion} {role}
-                    value += f"{time_str(infoDto['gameDuration'])}\n"                                                                                                                       # {duration}
-                    value += f"\u001b[0;36m{participantDto['kills']}/{participantDto['deaths']}/{participantDto['assists']}\u001b[0;0m "                                                    # {kda}
-                    value += f"\u001b[0;30m({round(100 * (participantDto['kills'] + participantDto['assists']) / teamDto['objectives']['champion']['kills'])}%)\u001b[0;0m | "              # {kill participation}
-                    value += f"CS: \u001b[0;36m{participantDto['totalMinionsKilled'] + participantDto['neutralMinionsKilled']}\u001b[0;0m"                                                  # {cs}
-                    value += f"\u001b[0;30m({round(60 * (participantDto['totalMinionsKilled'] + participantDto['neutralMinionsKilled']) / infoDto['gameDuration'], 1)})\u001b[0;0m | "      # {cs/min}
-                    value += f"Gold: \u001b[0;36m{participantDto['goldEarned']}\u001b[0;0m\n```"                                                                                            # {gold}
-                
-                embed.add_field(name="\t", value="\t", inline=False)
-                embed.add_field(name="Recent Games", value=value, inline=False)
-
-            await ctx.send(embed=embed)
+            # fetch each section concurrently, sections are None until loaded and False if they failed
+            sections = {'ranked': None, 'masteries': None, 'games': None}
+            fetches = {
+                asyncio.create_task(self.get_ranked(summoner)): 'ranked',
+                asyncio.create_task(self.get_masteries(summoner)): 'masteries',
+                asyncio.create_task(self.get_games(summoner)): 'games',
+            }
+
+            icon = await riot.get_summoner_icon(summoner['profileIconId'])
+
+            # send the header first, then edit in each section as it arrives
+            message = None
+            if PROGRESSIVE_EMBED:
+                message = await ctx.send(embed=self.summoner_embed(summoner, member, icon, sections))
+
+            pending = set(fetches)
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for fetch in done:
+                        try:
+                            sections[fetches[fetch]] = fetch.result()
+                        except Exception as e:
+                            print(f"riot: failed to load {fetches[fetch]} section ({e!r})")
+                            sections[fetches[fetch]] = False
+
+                    if message:
+                        await message.edit(embed=self.summoner_embed(summoner, member, icon, sections))
+            finally:
+                for fetch in pending:
+                    fetch.cancel()
+
+            if not message:
+                await ctx.send(embed=self.summoner_embed(summoner, member, icon, sections))
+
+    def summoner_embed(self, summoner: dict, member: discord.Member, icon: str, sections: dict) -> discord.Embed:
+        '''
+        Returns the summoner embed, with a placeholder for each section that is still loading or failed to load.
+        '''
+        def placeholder(section: str) -> str:
+            return "`Loading...`" if sections[section] == None else "`Unavailable`"
+
+        opgg_url = f"https://www.op.gg/summoners/na/{urllib.parse.quote(summoner['gameName'] + '-' + summoner['tagLine'])}"
+
+        embed = discord.Embed(title=f"{summoner['gameName']} #{summoner['tagLine']}", description=f"**Level:** `{summoner['summonerLevel']}`" + " \u200b"*5 + f"**[OP.GG]({opgg_url})**")
+        embed.set_thumbnail(url=icon)
+        if member:
+            embed.set_author(name=member.display_name, icon_url=member.display_avatar)
+
+        # ranked stats
+        if sections['ranked'] in (None, False):
+            embed.add_field(name="Ranked", value=placeholder('ranked'))
+        for name, value in sections['ranked'] or []:
+            embed.add_field(name=name, value=value)
+
+        # champion stats
+        if sections['masteries'] in (None, False) or sections['masteries']:
+            embed.add_field(name="\t", value="\t", inline=False)
+            embed.add_field(name="Highest Champion Mastery", value="\t" if sections['masteries'] else placeholder('masteries'), inline=False)
+        for name, value in sections['masteries'] or []:
+            embed.add_field(name=name, value=value, inline=True)
+
+        # recent games
+        if sections['games'] in (None, False) or sections['games']:
+            embed.add_field(name="\t", value="\t", inline=False)
+            embed.add_field(name="Recent Games", value=sections['games'] or placeholder('games'), inline=False)
+
+        return embed
+
+    async def get_ranked(self, summoner: dict) -> list[tuple[str, str]]:
+        '''
+        Returns the ranked stats fields of a summoner.
+        '''
+        fields = []
+        if stats := await riot.get_stats_by_summoner(summoner['id']):
+            for entry in [entry for entry in stats if "leagueId" in entry]:
+                fields.append((" ".join(entry['queueType'].split("_")[:-1]).title(), f"{entry['tier'].title()} {entry['rank']} `({entry['wins']}W|{entry['losses']}L)`"))
+        return fields
+
+    async def get_masteries(self, summoner: dict) -> list[tuple[str, str]]:
+        '''
+        Returns the champion mastery fields of a summoner.
+        '''
+        fields = []
+        if masteries := await riot.get_champion_masteries_by_puuid(summoner['puuid'], 3):
+            for mastery in masteries:
+                if not (champion := await riot.get_champion_by_id(mastery['championId'])):
+                    continue
+                fields.append((champion['name'], f"Level: `{mastery['championLevel']}`\nPoints: `{mastery['championPoints']}`"))
+        return fields
+
+    async def get_games(self, summoner: dict) -> str:
+        '''
+        Returns the recent games of a summoner, fetching the matches concurrently.
+        '''
+        if not (matchId := await riot.get_matchId_by_puuid(summoner['puuid'], 3)):
+            return ""
+
+        def win_str(win: bool):
+            if win: return "\u001b[0;34m[W]\u001b[0;0m"
+            return "\u001b[0;31m[L]\u001b[0;0m"
+        
+        def time_str(duration: int):
+            return f"{str(timedelta(seconds=duration)).lstrip(':0')}"
+        
+        def pos_str(position: str):
+            if not position: return ""
+            if position == "UTILITY": return " (Support)"
+            return f" ({position.title()})"
+        
+        matches = list(filter(None, await asyncio.gather(*[riot.get_match_by_id(id) for id in matchId])))
+        value = ""
+        for match in matches:
+            if not (participant := match.participant(summoner['puuid'])):
+                continue
+            team = match.team(participant.teamId)
+
+            value += f"<t:{str(match.gameCreation + match.gameDuration*1000)[:-3]}:R>\n"                                                                              # {timestamp}
+            value += f"```ansi\n{win_str(participant.win)} {match.gameMode} | "                                                                                           # {win/loss} {gamemode}
+            value += f"{participant.championName}{pos_str(participant.teamPosition)} | "                                                                                  # {champion} {role}
+            value += f"{time_str(match.gameDuration)}\n"                                                                                                                   # {duration}
+            value += f"\u001b[0;36m{participant.kills}/{participant.deaths}/{participant.assists}\u001b[0;0m "                                                             # {kda}
+            value += f"\u001b[0;30m({round(100 * (participant.kills + participant.assists) / max(team.kills, 1))}%)\u001b[0;0m | "                                           # {kill participation}
+            value += f"CS: \u001b[0;36m{participant.totalMinionsKilled + participant.neutralMinionsKilled}\u001b[0;0m"                                                     # {cs}
+            value += f"\u001b[0;30m({round(60 * (participant.totalMinionsKilled + participant.neutralMinionsKilled) / match.gameDuration, 1)})\u001b[0;0m | "               # {cs/min}
+            value += f"Gold: \u001b[0;36m{participant.goldEarned}\u001b[0;0m\n```"                                                                                         # {gold}
+
+        return value
 
     async def get_summoner(self, ctx: commands.Context, user: str = None) -> tuple[dict, discord.Member] | None:
         if not user:
@@ -162,7 +449,7 @@ class RiotCog(commands.Cog):
                 await error(ctx, "You are not registered.")
                 return
     
-            if not (summoner := riot.get_summoner_by_puuid(self.db[id]['puuid'])):
+            if not (summoner := await riot.summoners.get_by_puuid(self.db[id]['puuid'])):
                 await error(ctx, "Summoner not found.")
                 return
             
@@ -173,14 +460,14 @@ class RiotCog(commands.Cog):
                 await error(ctx, "User is not registered.")
                 return
             
-            if not (summoner := riot.get_summoner_by_puuid(self.db[id]['puuid'])):
+            if not (summoner := await riot.summoners.get_by_puuid(self.db[id]['puuid'])):
                 await error(ctx, "Summoner not found.")
                 return
             
             return summoner, ctx.guild.get_member(int(id))
             
         elif len(riot_id := user.split("#")) == 2:
-            if not (summoner := riot.get_summoner_by_name(riot_id[0], riot_id[1])):
+            if not (summoner := await riot.summoners.get_by_name(riot_id[0], riot_id[1])):
                 await error(ctx, "Summoner not found.")
                 return
             
@@ -190,31 +477,128 @@ class RiotCog(commands.Cog):
             await error(ctx, "Invalid user.\nUser must be a member or a Riot ID in the form {gameName}#{tagLine}.")
             return
         
+    @commands.hybrid_command(brief="View summoner stats over recent games.", description="View summoner stats over recent games.")
+    async def stats(self, ctx: commands.Context, games: Optional[commands.Range[int, 1, STATS_MAX_GAMES]] = 100, *, user: str = None):
+        clock = asyncio.get_running_loop().time
+        deadline = clock() + STATS_MAX_LOAD
+
+        # get summoner
+        if not (tupl := await self.get_summoner(ctx, user)):
+            return
+
+        async with ctx.typing():
+            summoner, member = tupl
+
+            if not (matchIds := await riot.get_matchId_by_puuid(summoner['puuid'], games)):
+                await error(ctx, "No games found.")
+                return
+
+            # cached games load at once, the rest at the pace of the rate limits
+            stats = riot.MatchStats(len(matchIds))
+            loading = asyncio.create_task(riot.load_match_stats(stats, summoner['puuid'], matchIds))
+            await asyncio.wait([loading], timeout=STATS_UPDATE_INTERVAL)
+
+        # send the games loaded so far, then edit in the rest as they arrive until the deadline
+        message = None
+        try:
+            while True:
+                done = loading.done() or clock() >= deadline
+
+                if len(stats):
+                    embed, file = await self.stats_embed(summoner, member, stats.snapshot(), done)
+                    if message:
+                        await message.edit(embed=embed, attachments=[file])
+                    else:
+                        message = await ctx.send(embed=embed, file=file)
+
+                if done:
+                    break
+                await asyncio.wait([loading], timeout=min(STATS_UPDATE_INTERVAL, max(deadline - clock(), 0)))
+        finally:
+            loading.cancel()
+
+        if not message:
+            await error(ctx, "No games found.")
+
+    async def stats_embed(self, summoner: dict, member: discord.Member, stats: riot.MatchStats, done: bool) -> tuple[discord.Embed, discord.File]:
+        '''
+        Returns the stats embed and its trend chart, rendered in a worker thread.
+        '''
+        chart = await asyncio.to_thread(riot.plot_trends, stats, STATS_WINDOW)
+        summary = stats.summary()
+
+        description  = f"**Win Rate:** `{100 * summary['win_rate']:.0f}%` `({summary['wins']}W|{summary['games'] - summary['wins']}L)`\n"
+        description += f"**KDA:** `{summary['kda']:.2f}` `({summary['kills']:.1f}/{summary['deaths']:.1f}/{summary['assists']:.1f})`\n"
+        description += f"**Kill Participation:** `{100 * summary['kill_participation']:.0f}%`\n"
+        description += f"**CS/min:** `{summary['cs_per_min']:.1f}`" + " \u200b"*5 + f"**Gold/min:** `{summary['gold_per_min']:.0f}`"
+
+        embed = discord.Embed(title=f"{summoner['gameName']} #{summoner['tagLine']}", description=description)
+        if member:
+            embed.set_author(name=member.display_name, icon_url=member.display_avatar)
+
+        def breakdown(groups: list[dict], name) -> str:
+            return "\n".join(f"{name(group['name'])} `{group['games']} games` `{100 * group['win_rate']:.0f}%` `{group['kda']:.2f} KDA` `{group['cs_per_min']:.1f} CS/min`"
+                             for group in groups[:STATS_ROWS])
+
+        embed.add_field(name="Champions", value=breakdown(stats.group('champion'), str), inline=False)
+        if roles := [group for group in stats.group('position') if group['name'] in POSITIONS]:
+            embed.add_field(name="Roles", value=breakdown(roles, POSITIONS.get), inline=False)
+
+        embed.set_image(url="attachment://stats.png")
+        if not done:
+            embed.set_footer(text=f"Last {len(stats)} games \u00B7 Loading {stats.fetched}/{stats.capacity}...")
+        else:
+            embed.set_footer(text=f"Last {len(stats)} games" + (f" ({stats.capacity - len(stats)} could not be loaded)" if len(stats) < stats.capacity else ""))
+
+        return embed, discord.File(io.BytesIO(chart), filename="stats.png")
+
     @commands.hybrid_command(brief="View champion splash art.", description="View champion splash art.")
     async def splash(self, ctx: commands.Context, champion: str):
-        if not (skins := riot.get_champion_skins_by_name(champion)):
+        if not (skins := await riot.get_champion_skins_by_name(champion)):
             await error(ctx, "Champion not found.")
             return
         
-        if not (img_data := requests.get(skins[0]['url']).content):
-            await error(ctx, "Failed to get image.")
+        view = PaginationView(skins)
+        embed, file = await view.render()
+
+        if file:
+            await ctx.send(embed=embed, file=file, view=view)
+        else:
+            await ctx.send(embed=embed, view=view)
+
+    @commands.hybrid_command(brief="View the server's ranked leaderboard.", description="View the server's ranked leaderboard.")
+    @commands.guild_only()
+    async def ranked(self, ctx: commands.Context, queue: Literal['solo', 'flex'] = 'solo'):
+        rows = []
+        for id, entry in self.standings[queue]:
+            if not (member := ctx.guild.get_member(int(id))):
+                continue
+            rows.append(f"**{len(rows) + 1}.** {member.mention} {entry['tier'].title()} {entry['rank']} `{entry['leaguePoints']} LP` `({entry['wins']}W|{entry['losses']}L)`")
+
+        if not rows:
+            await error(ctx, "No ranked members yet.\nRegister with `/register`, ranks are refreshed in the background.")
             return
-        
-        img_name = skins[0]['url'].split("/")[-1]
 
-        with open("downloads/" + img_name, "wb") as handler:
-            handler.write(img_data)
+        view = LeaderboardView(f"{ctx.guild.name} {queue.title()} Queue", rows)
+        await ctx.send(embed=view.render(), view=view)
 
-        file = discord.File(fp="downloads/" + img_name)
-        
-        embed = discord.Embed(title=skins[0]['name'].title(), description="\t")
-        embed.set_image(url="attachment://" + img_name)
-        embed.set_footer(text=f"1/{len(skins)}")
+    # match cache statistics
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def matchcache(self, ctx: commands.Context):
+        stats = riot.matches.stats()
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+
+        description = (f"**Memory:** `{stats['hits']}` hits \u00B7 `{stats['memory']}` matches\n"
+                       f"**Disk:** `{stats['disk_hits']}` hits \u00B7 `{stats['files']}` matches \u00B7 `{stats['bytes'] / 1024**2:.1f} MB`\n"
+                       f"**API:** `{stats['misses']}` misses\n"
+                       f"**Hit Rate:** `{100 * (lookups - stats['misses']) / lookups if lookups else 0:.1f}%`")
 
-        await ctx.send(embed=embed, file=file, view=PaginationView(skins))
+        await ctx.reply(embed=discord.Embed(title="Match Cache", description=description))
 
-        file.close()
-        os.remove("downloads/" + img_name)
+    @splash.autocomplete('champion')
+    async def champion_autocomplete(self, interaction: discord.Interaction, current: str) -> list[discord.app_commands.Choice[str]]:
+        return [discord.app_commands.Choice(name=riot.ddragon.champions[id]['name'], value=id) for id in riot.ddragon.search(current)]
 
 async def error(ctx: commands.Context, description: str):
     embed = discord.Embed(title="Woops...", description=description)
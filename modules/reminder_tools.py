@@ -1,181 +1,322 @@
+import os
 import re
+import json
+import heapq
+import bisect
+import sqlite3
+import asyncio
+import zoneinfo
+import functools
+import itertools
 import datetime
 from datetime import timedelta
 from dateutil.relativedelta import relativedelta
 
-now : datetime.datetime = None
+PARSE_CACHE_SIZE = 4096
 
-def parse_time(string: str):
+EXAMPLES = [
+    "/remindme in 2h30m drink water",
+    "/remindme at 5pm on sept 21",
+    "/remindme thursday at 3:45 do laundry",
+    "/remindme on january 6 2021 raid capitol",
+    "/remindme tmr 8am kiss the homies",
+]
+
+UNITS = {
+    'am': 'am',
+    'a':  'am',
+    'pm': 'pm',
+    'p':  'pm',
+
+    'jan': 1,
+    'feb': 2,
+    'mar': 3,
+    'apr': 4,
+    'may': 5,
+    'jun': 6,
+    'jul': 7,
+    'aug': 8,
+    'sep': 9,
+    'oct': 10,
+    'nov': 11,
+    'dec': 12,
+
+    'mon': 0,
+    'tue': 1,
+    'wed': 2,
+    'thu': 3,
+    'fri': 4,
+    'sat': 5,
+    'sun': 6,
+
+    'tmr': 'tmr',
+    'tom': 'tmr'
+}
+
+TIMEDELTA_UNITS = {
+    's':  'seconds',
+    'm':  'minutes',
+    'h':  'hours',
+    'd':  'days',
+    'w':  'weeks',
+    'mo': 'months',
+    'y':  'years',
+}
+
+# one alternative per token type, tried in order: timedelta, date, time, weekday
+TOKEN_PATTERN = re.compile(
+    r"\s*(?:"
+    r"(?P<delta>(?:in\s?)?(?P<amount>\d+\.?\d?)(?P<unit>y|mo|w|d|h|m|s))"
+    r"|(?P<date>(?:on\s?)?(?P<month>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\s?(?P<day>3[0-1]|[0-2]?[0-9])(?:[,\s]*(?P<year>\d{4}))?)"
+    r"|(?P<time>(?:at\s?)?(?P<hour>1[0-2]|[0-9])(?::(?P<minute>[0-5][0-9]))?\s?(?P<period>am|a|pm|p)?)"
+    r"|(?P<dayname>(?:on\s?)?(?P<weekday>mon|tue|wed|thu|fri|sat|sun|tmr|tom)[a-z]*)"
+    r")\s*",
+    flags=re.I
+)
+
+TOKEN_FIELDS = {
+    'date': ('month', 'day', 'year'),
+    'time': ('hour', 'minute', 'period'),
+    'dayname': ('weekday',),
+}
+
+# "every {interval}" | "every {period}" | "every {weekday}" (the weekday is left for parse_time)
+REPEAT_PATTERN = re.compile(
+    r"\s*every\s*(?:"
+    r"(?P<interval>(?:\d+\.?\d?(?:y|mo|w|d|h|m|s))+)"
+    r"|(?P<period>weekday|weekend|day|week|month|year)s?\b"
+    r"|(?=(?:mon|tue|wed|thu|fri|sat|sun)))\s*",
+    flags=re.I
+)
+
+REPEAT_PERIODS = {
+    'day':   '1d',
+    'week':  '1w',
+    'month': '1mo',
+    'year':  '1y',
+}
+
+REPEAT_WEEKDAYS = {
+    'weekday': (0, 1, 2, 3, 4),
+    'weekend': (5, 6),
+}
+
+MIN_REPEAT_INTERVAL = timedelta(minutes=1)
+
+def parse_time(string: str, now: datetime.datetime = None, timezone: str = None):
     '''
     Parses a string containing a date/time/timedelta.
 
+    Date/time is determined with respect to `now` (default: current time) in the given IANA time zone (default: `now`'s time zone).
+
     Returns
         :class:`datetime`: time relative to the reference time.
         :class:`string`: remaining string.
     '''
-    global now 
-    now = datetime.datetime.now(datetime.timezone.utc).astimezone()
+    now = reference_time(now, timezone)
 
-    time_dict = {'month': None, 'day': None, 'year': None, 'hour': None, 'minute': None, 'period': None, 'weekday': None}
+    if not (tokens := tokenize(string)):
+        raise ValueError("Invalid string format.")
+
+    kind, value, string = tokens
 
     # match timedelta
-    if match := match_timedelta(string):
-        return now + match[0], match[1].replace('\n', ' ').strip()
-    
-    # match date/time/weekday
-    while (match := match_date(string)) or (match := match_time(string)) or (match := match_weekday(string)):
-        time_dict.update(match[0])
-        string = match[1]
-
-    # if date/time/weekday was matched
-    if not all(value == None for value in time_dict.values()):
-        date = interpret_time(**time_dict)
-        
-    else:
-        raise ValueError("Invalid string format.")
-    
-    return date, string.replace('\n', ' ').strip()
+    if kind == 'delta':
+        return add_interval(now, value), string
 
-def parse(string: str):
-    units = {
-        'am': 'am',
-        'a':  'am',
-        'pm': 'pm',
-        'p':  'pm',
-
-        'jan': 1,
-        'feb': 2,
-        'mar': 3,
-        'apr': 4,
-        'may': 5,
-        'jun': 6,
-        'jul': 7,
-        'aug': 8,
-        'sep': 9,
-        'oct': 10,
-        'nov': 11,
-        'dec': 12,
-
-        'mon': 0,
-        'tue': 1,
-        'wed': 2,
-        'thu': 3,
-        'fri': 4,
-        'sat': 5,
-        'sun': 6,
-
-        'tmr': now.weekday() + 1,
-        'tom': now.weekday() + 1
-    }
+    # match date/time/weekday
+    time_dict = dict(value)
+    if time_dict['weekday'] == 'tmr':
+        time_dict['weekday'] = (now.weekday() + 1) % 7
 
-    if string == None:
-        return string
-    elif string.isdigit():
-        return int(string)
-    else:
-        return units[string[:3].lower()]
+    return interpret_time(**time_dict, now=now), string
 
-def match_timedelta(string: str):
+def tokenize(string: str) -> tuple[str, timedelta | relativedelta | tuple, str] | None:
     '''
-    If timedelta is found at beginning of string:
-        return tuple( `timedelta`, `remaining string` )
-    Else:
-        return `None`
-    '''
-    timedelta_pattern = r"\s*(?:in\s?)?(\d+\.?\d?)(y|mo|w|d|h|m|s)\s*"
+    Splits a string into its date/time/timedelta tokens and the remaining string.
 
-    if re.match(timedelta_pattern, string, flags=re.I):
-        delta = timedelta()
-        while match := re.match(timedelta_pattern, string, flags=re.I):
-            delta += to_timedelta(*match.groups())
-            string = string[match.end():]
+    Only the time expression at the start of the string is parsed and cached, see :func:`parse_tokens`, so the task text does not affect cache hits.
 
-        return delta, string.replace('\n', ' ').strip()
+    Returns
+        tuple( 'delta', `timedelta`, `remaining string` ) |
+        tuple( 'time', `time_dict items`, `remaining string` ) |
+        `None`
+    '''
+    # a run of timedeltas or a run of date/time tokens, a timedelta after a date/time is left in the remaining string
+    end, delta = 0, None
+    while (match := TOKEN_PATTERN.match(string, end)) and delta in (None, bool(match['delta'])):
+        end, delta = match.end(), bool(match['delta'])
 
-    else:
+    if not end:
         return None
 
+    return *parse_tokens(string[:end].strip()), string[end:].replace('\n', ' ').strip()
 
-def match_time(string: str):
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_tokens(prefix: str) -> tuple[str, timedelta | relativedelta | tuple]:
     '''
-    If time is found at beginning of string:
-        return tuple( `time_dict`, `remaining string` )
-    Else:
-        return `None`
+    Parses a time expression found by :func:`tokenize`.
+
+    The result does not depend on the reference time, so it is cached.
+
+    Returns
+        tuple( 'delta', `timedelta` ) |
+        tuple( 'time', `time_dict items` )
     '''
-    time_pattern = r"\s*(?:at\s?)?(1[0-2]|[0-9])(?::([0-5][0-9]))?\s?(am|a|pm|p)?\s*"
+    if (match := TOKEN_PATTERN.match(prefix)) and match['delta']:
+        delta = timedelta()
+        while match:
+            delta += to_timedelta(match['amount'], match['unit'])
+            match = TOKEN_PATTERN.match(prefix, match.end())
+
+        return 'delta', delta
+
+    time_dict = {'month': None, 'day': None, 'year': None, 'hour': None, 'minute': None, 'period': None, 'weekday': None}
 
-    if (match := re.match(time_pattern, string, flags=re.I)):
-        matched = [parse(m) for m in match.groups()]
+    while match:
+        token = match.lastgroup
+        for field in TOKEN_FIELDS[token]:
+            time_dict[field] = parse(match[field])
 
         # correct hour
-        if matched[0] == 12:
-            matched[0] = 0
+        if token == 'time' and time_dict['hour'] == 12:
+            time_dict['hour'] = 0
 
-        time_dict = {i: j for i, j in zip(['hour', 'minute', 'period'], matched)}
-        string = string[match.end():]
+        match = TOKEN_PATTERN.match(prefix, match.end())
 
-        return time_dict, string
-    
+    return 'time', tuple(time_dict.items())
+
+def parse_reminder(string: str, now: datetime.datetime = None, timezone: str = None):
+    '''
+    Parses a string containing an optional "every ..." repeat rule followed by a date/time/timedelta.
+
+    Date/time is determined with respect to `now` (default: current time) in the given IANA time zone (default: `now`'s time zone).
+
+    If a repeat rule is given without a date/time/timedelta, the first occurrence is one interval from `now`.
+
+    Returns
+        :class:`datetime`: time of the first occurrence.
+        :class:`string` | `None`: repeat rule.
+        :class:`string`: remaining string.
+    '''
+    now = reference_time(now, timezone)
+
+    if not (match := REPEAT_PATTERN.match(string)):
+        return *parse_time(string, now), None
+
+    if match['interval']:
+        rule = match['interval'].lower()
+    elif match['period']:
+        rule = match['period'].lower()
+        rule = REPEAT_PERIODS.get(rule, rule)
     else:
-        return None
-    
-def match_date(string: str):
+        rule = '1w'
+
+    if (step := match_timedelta(rule)) and isinstance(step[0], timedelta) and step[0] < MIN_REPEAT_INTERVAL:
+        raise ValueError("Repeat interval is too short.")
+
+    string = string[match.end():]
+
+    try:
+        time, string = parse_time(string, now)
+    except ValueError:
+        time, string = next_occurrence(rule, now, now), string.replace('\n', ' ').strip()
+
+    # move to the first allowed weekday
+    if rule in REPEAT_WEEKDAYS:
+        while time.weekday() not in REPEAT_WEEKDAYS[rule]:
+            time += timedelta(days=1)
+
+    return time, string, rule
+
+def next_occurrence(rule: str, time: datetime.datetime, now: datetime.datetime, anchor: datetime.datetime = None) -> datetime.datetime:
     '''
-    If date is found at beginning of string:
-        return tuple( `time_dict`, `remaining string` )
-    Else:
-        return `None`
+    Returns the first occurrence of a repeat rule after `now`, stepping from the occurrence at `time`.
+
+    Month and year intervals are counted from the first occurrence `anchor` (default: `time`), so a reminder on the 31st returns to the 31st after a shorter month.
     '''
-    date_pattern = r"\s*(?:on\s?)?(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\s?(3[0-1]|[0-2]?[0-9])(?:[,\s]*(\d{4}))?\s*"
+    if rule in REPEAT_WEEKDAYS:
+        # skip to the current day after downtime
+        if time <= now:
+            time += timedelta(days=(now - time).days)
 
-    if (match := re.match(date_pattern, string, flags=re.I)):
-        matched = [parse(m) for m in match.groups()]
+        time += timedelta(days=1)
+        while time <= now or time.weekday() not in REPEAT_WEEKDAYS[rule]:
+            time += timedelta(days=1)
 
-        time_dict = {i: j for i, j in zip(['month', 'day', 'year'], matched)}
-        string = string[match.end():]
+        return time
 
-        return time_dict, string
-    
+    step = match_timedelta(rule)[0]
+
+    if isinstance(step, relativedelta):
+        anchor = anchor or time
+
+        count = 1
+        while (occurrence := anchor + step * count) <= max(time, now):
+            count += 1
+
+        return occurrence
+
+    # whole days keep the wall-clock time across DST changes, shorter intervals step in real time
+    zone = time.tzinfo
+    if step % timedelta(days=1):
+        time, now = time.astimezone(datetime.timezone.utc), now.astimezone(datetime.timezone.utc)
+
+    # skip missed occurrences after downtime
+    if time <= now:
+        time += step * ((now - time) // step)
+
+    time += step
+    while time <= now:
+        time += step
+
+    return time.astimezone(zone)
+
+def add_interval(time: datetime.datetime, step: timedelta | relativedelta) -> datetime.datetime:
+    '''
+    Returns `time` plus an interval.
+
+    Whole days, months and years keep the wall-clock time across DST changes, other intervals are real elapsed time.
+    '''
+    if isinstance(step, timedelta) and step % timedelta(days=1):
+        return (time.astimezone(datetime.timezone.utc) + step).astimezone(time.tzinfo)
+    return time + step
+
+def describe_repeat(rule: str) -> str:
+    '''
+    Returns a repeat rule as text, e.g. "every weekday".
+    '''
+    names = {value: key for key, value in REPEAT_PERIODS.items()}
+    return f"every {names.get(rule, rule)}"
+
+def parse(string: str):
+    if string == None:
+        return string
+    elif string.isdigit():
+        return int(string)
     else:
-        return None
-    
-def match_weekday(string: str):
+        return UNITS[string[:3].lower()]
+
+def match_timedelta(string: str):
     '''
-    If weekday is found at beginning of string:
-        return tuple( `time_dict`, `remaining string` )
+    If timedelta is found at beginning of string:
+        return tuple( `timedelta`, `remaining string` )
     Else:
         return `None`
     '''
-    weekday_pattern = r"\s*(?:on\s?)?(mon|tue|wed|thu|fri|sat|sun|tmr|tom)[a-z]*\s*"
+    if (tokens := tokenize(string)) and tokens[0] == 'delta':
+        return tokens[1], tokens[2]
 
-    if (match := re.match(weekday_pattern, string, flags=re.I)):
-        time_dict = {'weekday': parse(match.groups()[0])}
-        string = string[match.end():]
-
-        return time_dict, string
-    
     else:
         return None
-    
+
 def to_timedelta(amount, unit):
     '''
     Returns a :class:`timedelta` | :class:`relativedelta` object.
 
     Valid units: [ y | mo | w | d | h | m | s]
     '''
-
-    units = {
-    's':  'seconds',
-    'm':  'minutes',
-    'h':  'hours',
-    'd':  'days',
-    'w':  'weeks',
-    'mo': 'months',
-    'y':  'years',
-    }
-
-    if (unit := units.get(unit.lower())) and (amount := to_float(amount)):
+    if (unit := TIMEDELTA_UNITS.get(unit.lower())) and (amount := to_float(amount)):
         if unit == 'months':
             return relativedelta(months=+int(amount), days=+int(30*(amount%1)))
         elif unit == 'years':
@@ -187,22 +328,23 @@ def to_timedelta(amount, unit):
         raise ValueError("Invalid unit.")
     
 def interpret_time(month: int = None, day: int = None, year: int = None, 
-                   hour: int = None, minute: int = None, period: str = None, weekday: int = None):
+                   hour: int = None, minute: int = None, period: str = None, weekday: int = None,
+                   now: datetime.datetime = None, timezone: str = None):
     '''
     Returns the earliest possible date with the given time information.
     
-    Date is determined with respect to the current time.
+    Date is determined with respect to `now` (default: current time) in the given IANA time zone (default: `now`'s time zone).
 
     If hour/minute/period is not given, default is 12:00 AM.
 
     Returns
-        :class:`datetime.datetime`: time relative to current time.
+        :class:`datetime.datetime`: time relative to `now`.
     '''
-    
-    loc = locals()
-    time_dict = {i: loc[i] for i in ('year', 'month', 'day', 'hour', 'minute')}
+    now = reference_time(now, timezone)
+
+    time_dict = {'year': year, 'month': month, 'day': day, 'hour': hour, 'minute': minute}
 
-    date = midnight().replace(**{i: time_dict[i] for i in time_dict if time_dict[i] != None}) + relativedelta(weekday=weekday)
+    date = midnight(now).replace(**{i: time_dict[i] for i in time_dict if time_dict[i] != None}) + relativedelta(weekday=weekday)
 
     # apply corrections
     if period == 'am' and date.hour in range(12, 24):
@@ -234,7 +376,7 @@ def to_float(string):
     except:
         return None
     
-def midnight():
+def midnight(now: datetime.datetime):
     return datetime.datetime.combine(now.date(), datetime.time(tzinfo=now.tzinfo))
 
 def time_diff(t1: datetime.time, t2: datetime.time):
@@ -242,4 +384,658 @@ def time_diff(t1: datetime.time, t2: datetime.time):
     Returns `t1` - `t2` as a :class:`timedelta`.
     '''
     return datetime.datetime.combine(datetime.date(1,1,1), t1) - datetime.datetime.combine(datetime.date(1,1,1), t2)
-    
\ No newline at end of file
+
+# Time Zones
+#---------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+@functools.lru_cache(maxsize=None)
+def get_zone(timezone: str) -> zoneinfo.ZoneInfo:
+    '''
+    Returns the time zone with the given IANA name.
+
+    Zones are cached, so resolving a user's zone never reads the tz database twice.
+    '''
+    return zoneinfo.ZoneInfo(timezone)
+
+@functools.lru_cache(maxsize=1)
+def get_zone_names() -> list[str]:
+    '''
+    Returns the sorted IANA time zone names.
+    '''
+    return sorted(zoneinfo.available_timezones())
+
+def local_time(timestamp: float, timezone: str = None) -> datetime.datetime:
+    '''
+    Returns a UTC epoch timestamp as a :class:`datetime` in the given IANA time zone (default: host's local time zone).
+    '''
+    date = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+    if timezone:
+        return date.astimezone(get_zone(timezone))
+    return date.astimezone()
+
+def reference_time(now: datetime.datetime = None, timezone: str = None) -> datetime.datetime:
+    '''
+    Returns `now` (default: current time) in the given IANA time zone (default: `now`'s time zone, or the host's local time zone).
+    '''
+    if now == None:
+        return local_time(timestamp(), timezone)
+    if timezone:
+        return now.astimezone(get_zone(timezone))
+    return now
+
+def to_timestamp(date: datetime.datetime) -> int:
+    '''
+    Returns a :class:`datetime` as a UTC epoch timestamp.
+    '''
+    return round(date.timestamp())
+
+def timestamp() -> float:
+    '''
+    Returns the current UTC epoch timestamp.
+    '''
+    return datetime.datetime.now(datetime.timezone.utc).timestamp()
+    
+
+# Reminder List
+#---------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class ReminderList():
+    '''
+    A user's reminders, ordered by due time (UTC epoch).
+
+    Also tracks the most recently modified reminder.
+    '''
+    def __init__(self, reminders: list[dict] = None):
+        self.reminders = sorted(reminders or [], key=lambda x: x['time'])
+        self._recent = None
+
+    def __len__(self):
+        return len(self.reminders)
+
+    def __iter__(self):
+        return iter(self.reminders)
+
+    def __getitem__(self, index: int | slice):
+        return self.reminders[index]
+
+    @property
+    def recent(self) -> dict | None:
+        '''
+        The most recently modified reminder.
+        '''
+        # rebuilt only after the recent reminder is removed
+        if self._recent == None and self.reminders:
+            self._recent = max(self.reminders, key=lambda x: x['modified'])
+        return self._recent
+
+    def bisect(self, time: float) -> int:
+        '''
+        Returns the index of the first reminder due after `time`.
+        '''
+        return bisect.bisect_right(self.reminders, time, key=lambda x: x['time'])
+
+    def add(self, reminder: dict) -> int:
+        '''
+        Inserts a reminder by time. Returns its index.
+        '''
+        index = self.bisect(reminder['time'])
+        self.reminders.insert(index, reminder)
+        self.touch(reminder)
+        return index
+
+    def extend(self, reminders: list[dict]):
+        '''
+        Inserts many reminders at once.
+        '''
+        # both runs are sorted, so this is a linear merge
+        self.reminders = sorted(self.reminders + sorted(reminders, key=lambda x: x['time']), key=lambda x: x['time'])
+        for reminder in reminders:
+            self.touch(reminder)
+
+    def index(self, reminder: dict) -> int:
+        '''
+        Returns the index of a reminder.
+        '''
+        index = bisect.bisect_left(self.reminders, reminder['time'], key=lambda x: x['time'])
+        while index < len(self.reminders) and self.reminders[index]['time'] == reminder['time']:
+            if self.reminders[index] is reminder:
+                return index
+            index += 1
+
+        raise ValueError("Reminder not found.")
+
+    def remove(self, reminder: dict):
+        '''
+        Removes a reminder.
+        '''
+        self.pop([self.index(reminder)])
+
+    def pop(self, indexes: list[int]) -> list[dict]:
+        '''
+        Removes the reminders at the given indexes. Returns the removed reminders in index order.
+        '''
+        reminders = [self.reminders[i] for i in indexes]
+
+        for i in sorted(set(indexes), reverse=True):
+            del self.reminders[i]
+
+        if any(reminder is self._recent for reminder in reminders):
+            self._recent = None
+
+        return reminders
+
+    def touch(self, reminder: dict):
+        '''
+        Marks a reminder as modified.
+        '''
+        if self._recent == None or reminder['modified'] >= self._recent['modified']:
+            self._recent = reminder
+
+# Scheduler
+#---------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+class Scheduler():
+    '''
+    Min-heap of pending reminders ordered by due time (UTC epoch).
+
+    Removed reminders are marked in place and skipped when they reach the top of the heap.
+    '''
+    def __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.counter = itertools.count()
+        self.changed = asyncio.Event()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def push(self, user_id: str, reminder: dict):
+        '''
+        Schedules a reminder. Wakes the scheduler if the reminder is now the earliest.
+        '''
+        self.remove(reminder)
+
+        entry = [reminder['time'], next(self.counter), user_id, reminder]
+        self.entries[id(reminder)] = entry
+        heapq.heappush(self.heap, entry)
+
+        if self.heap[0] is entry:
+            self.changed.set()
+
+    def remove(self, reminder: dict):
+        '''
+        Unschedules a reminder. Wakes the scheduler if the reminder was the earliest.
+        '''
+        if not (entry := self.entries.pop(id(reminder), None)):
+            return
+
+        if self.heap[0] is entry:
+            self.changed.set()
+
+        entry[-1] = None
+
+    def peek(self) -> int | None:
+        '''
+        Returns the due time of the earliest reminder.
+        '''
+        while self.heap and self.heap[0][-1] is None:
+            heapq.heappop(self.heap)
+
+        if self.heap:
+            return self.heap[0][0]
+
+    def pop_due(self, now: float) -> list[tuple[str, dict]]:
+        '''
+        Pops every reminder due at or before `now`.
+
+        Returns
+            list[tuple[`user_id`, `reminder`]]
+        '''
+        due = []
+        while (time := self.peek()) and time <= now:
+            _, _, user_id, reminder = heapq.heappop(self.heap)
+            del self.entries[id(reminder)]
+            due.append((user_id, reminder))
+
+        return due
+
+    async def wait(self):
+        '''
+        Sleeps until the earliest reminder is due or the earliest reminder changes.
+        '''
+        self.changed.clear()
+
+        timeout = None
+        if time := self.peek():
+            timeout = max(0, time - timestamp())
+
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+# Storage
+#---------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+DATE_PATTERN = r"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}-[0-9]{2}:[0-9]{2}"
+
+def date_hook(json_dict):
+    for (key, value) in json_dict.items():
+        if isinstance(value, str) and re.match(DATE_PATTERN, value):
+            json_dict[key] = datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S%z")
+    return json_dict
+
+class ReminderDB():
+    '''
+    SQLite (WAL) reminder storage.
+
+    Reminders are stored one row each, so every change is a single-row write. Times are UTC epoch timestamps.
+
+    Delivered one-off reminders are kept (with their delivery time) until pruned, so they can be snoozed.
+
+    Channel reminders store the ID of the channel they are posted to, other reminders are sent by DM.
+    '''
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS reminders ("
+                              "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, time INTEGER NOT NULL, "
+                              "task TEXT NOT NULL, url TEXT, created INTEGER NOT NULL, modified INTEGER NOT NULL, repeat TEXT, delivered INTEGER, channel INTEGER, anchor INTEGER)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS reminders_time ON reminders (time)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS reminders_user ON reminders (user_id, time)")
+
+            self.conn.execute("CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, timezone TEXT)")
+
+            # add columns missing from older databases
+            columns = [row['name'] for row in self.conn.execute("PRAGMA table_info(reminders)")]
+            for column, type in (('repeat', 'TEXT'), ('delivered', 'INTEGER'), ('channel', 'INTEGER'), ('anchor', 'INTEGER')):
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE reminders ADD COLUMN {column} {type}")
+
+    def migrate(self, json_path: str):
+        '''
+        Imports reminders from a legacy json database, then renames the json file so it is only imported once.
+        '''
+        try:
+            with open(json_path, 'r') as f:
+                db = json.load(f, object_hook=date_hook)
+        except FileNotFoundError:
+            return
+
+        with self.conn:
+            for id in db:
+                for reminder in db[id]:
+                    reminder = {key: to_timestamp(value) if isinstance(value, datetime.datetime) else value for key, value in reminder.items()}
+                    self.insert(id, reminder, commit=False)
+
+        os.replace(json_path, json_path + ".bak")
+
+    def load(self, now: float) -> dict[str, list[dict]]:
+        '''
+        Returns pending reminders grouped by user, sorted by time.
+        '''
+        db = {}
+        for row in self.conn.execute("SELECT * FROM reminders WHERE time > ? AND delivered IS NULL ORDER BY time", (now,)):
+            db.setdefault(str(row['user_id']), []).append(self.from_row(row))
+        return db
+
+    def expired(self, now: float) -> dict[str, list[dict]]:
+        '''
+        Returns reminders that are due at or before `now`, grouped by user, sorted by time.
+
+        Recurring reminders are moved to their next occurrence in the user's time zone, one-off reminders are left for the caller to delete.
+        '''
+        db = {}
+        updates = []
+        for row in self.conn.execute("SELECT reminders.*, users.timezone FROM reminders LEFT JOIN users USING (user_id) "
+                                     "WHERE time <= ? AND delivered IS NULL ORDER BY time", (now,)):
+            db.setdefault(str(row['user_id']), []).append(reminder := self.from_row(row))
+
+            if reminder['repeat']:
+                time = next_occurrence(reminder['repeat'], local_time(reminder['time'], row['timezone']), local_time(now, row['timezone']),
+                                       local_time(reminder['anchor'] or reminder['time'], row['timezone']))
+                updates.append((to_timestamp(time), reminder['id']))
+
+        with self.conn:
+            self.conn.executemany("UPDATE reminders SET time = ? WHERE id = ?", updates)
+
+        return db
+
+    def insert(self, user_id: int | str, reminder: dict, commit: bool = True) -> int:
+        '''
+        Inserts a reminder and sets its `id`.
+        '''
+        cursor = self.conn.execute("INSERT INTO reminders (user_id, time, task, url, created, modified, repeat, channel, anchor) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (int(user_id), reminder['time'], reminder['task'], reminder['url'],
+                                    reminder['created'], reminder['modified'], reminder.get('repeat'), reminder.get('channel'), reminder.get('anchor')))
+        if commit:
+            self.conn.commit()
+
+        reminder['id'] = cursor.lastrowid
+        return reminder['id']
+
+    def insert_many(self, user_id: int | str, reminders: list[dict]):
+        '''
+        Inserts reminders in one transaction and sets their `id`.
+        '''
+        with self.conn:
+            for reminder in reminders:
+                self.insert(user_id, reminder, commit=False)
+
+    def delete(self, reminders: list[dict]):
+        '''
+        Deletes reminders.
+        '''
+        with self.conn:
+            self.conn.executemany("DELETE FROM reminders WHERE id = ?", [(reminder['id'],) for reminder in reminders])
+
+    def get(self, id: int) -> tuple[str, dict, bool] | None:
+        '''
+        Returns tuple( `user_id`, `reminder`, `delivered` ) for a reminder ID.
+        '''
+        if row := self.conn.execute("SELECT * FROM reminders WHERE id = ?", (id,)).fetchone():
+            return str(row['user_id']), self.from_row(row), row['delivered'] != None
+
+    def archive(self, reminders: list[dict], now: float):
+        '''
+        Marks one-off reminders as delivered.
+        '''
+        with self.conn:
+            self.conn.executemany("UPDATE reminders SET delivered = ? WHERE id = ?", [(round(now), reminder['id']) for reminder in reminders])
+
+    def restore(self, reminder: dict):
+        '''
+        Makes a delivered reminder pending again with its current `time` and `modified`.
+        '''
+        with self.conn:
+            self.conn.execute("UPDATE reminders SET time = ?, modified = ?, delivered = NULL WHERE id = ?",
+                              (reminder['time'], reminder['modified'], reminder['id']))
+
+    def prune(self, before: float):
+        '''
+        Deletes reminders delivered before `before`.
+        '''
+        with self.conn:
+            self.conn.execute("DELETE FROM reminders WHERE delivered < ?", (before,))
+
+    def reschedule(self, reminders: list[dict]):
+        '''
+        Saves the `time` of reminders.
+        '''
+        with self.conn:
+            self.conn.executemany("UPDATE reminders SET time = ? WHERE id = ?", [(reminder['time'], reminder['id']) for reminder in reminders])
+
+    def touch(self, reminder: dict):
+        '''
+        Saves the `modified` time of a reminder.
+        '''
+        with self.conn:
+            self.conn.execute("UPDATE reminders SET modified = ? WHERE id = ?", (reminder['modified'], reminder['id']))
+
+    def timezones(self) -> dict[str, str]:
+        '''
+        Returns the time zone name of each user who set one.
+        '''
+        return {str(row['user_id']): row['timezone'] for row in self.conn.execute("SELECT * FROM users WHERE timezone IS NOT NULL")}
+
+    def set_timezone(self, user_id: int | str, timezone: str | None):
+        '''
+        Saves a user's time zone name.
+        '''
+        with self.conn:
+            self.conn.execute("INSERT INTO users (user_id, timezone) VALUES (?, ?) ON CONFLICT (user_id) DO UPDATE SET timezone = excluded.timezone",
+                              (int(user_id), timezone))
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def from_row(row: sqlite3.Row) -> dict:
+        return {'id': row['id'], 'time': row['time'], 'task': row['task'], 'url': row['url'],
+                'created': row['created'], 'modified': row['modified'], 'repeat': row['repeat'], 'channel': row['channel'], 'anchor': row['anchor']}
+
+# Calendar
+#---------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+ICS_FREQUENCIES = {
+    'y':  'YEARLY',
+    'mo': 'MONTHLY',
+    'w':  'WEEKLY',
+    'd':  'DAILY',
+    'h':  'HOURLY',
+    'm':  'MINUTELY',
+    's':  'SECONDLY',
+}
+
+ICS_WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+# most occurrences of an imported series with an end (COUNT or UNTIL) added as one-off reminders
+ICS_MAX_OCCURRENCES = 100
+
+# name;param=value;param="value":value
+ICS_PROPERTY = re.compile(r'(?P<name>[A-Za-z0-9-]+)(?P<params>(?:;[A-Za-z0-9-]+=(?:"[^"]*"|[^";:]*))*):(?P<value>.*)')
+
+def to_ics(reminders: list[dict]):
+    '''
+    Yields reminders as the lines of an iCalendar file, encoded as UTF-8.
+
+    Times are written in UTC. Repeat rules that iCalendar cannot express (e.g. "every 1.5mo") are left out.
+    '''
+    yield b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//reminder_bot//EN\r\n"
+
+    for reminder in reminders:
+        yield b"BEGIN:VEVENT\r\n"
+        yield ics_line(f"UID:{reminder['id']}@reminder_bot")
+        yield ics_line(f"DTSTAMP:{ics_time(reminder['created'])}")
+        yield ics_line(f"DTSTART:{ics_time(reminder['time'])}")
+        yield ics_line(f"SUMMARY:{ics_escape(reminder['task'])}")
+
+        if reminder['url']:
+            yield ics_line(f"URL:{reminder['url']}")
+
+        if reminder['repeat'] and (rule := to_rrule(reminder['repeat'])):
+            yield ics_line(f"RRULE:{rule}")
+
+        yield b"END:VEVENT\r\n"
+
+    yield b"END:VCALENDAR\r\n"
+
+def from_ics(lines, timezone: str = None):
+    '''
+    Parses the lines of an iCalendar file one event at a time.
+
+    Times without a time zone are read in the given IANA time zone (default: host's local time zone).
+    Events without a start time are skipped.
+
+    Yields
+        :class:`dict`: `time` (UTC epoch), `task`, `url`, `repeat`, and the `until` (UTC epoch) and `count` ending the repeat of each event.
+    '''
+    event = None
+
+    for line in ics_unfold(lines):
+        if not (match := ICS_PROPERTY.fullmatch(line)):
+            continue
+
+        name, params, value = match['name'].upper(), match['params'], match['value']
+
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {}
+        elif event == None:
+            continue
+        elif name == 'END' and value.upper() == 'VEVENT':
+            if 'time' in event:
+                # UNTIL is in the time zone of DTSTART, which may come after RRULE
+                repeat, until, count = from_rrule(event['rrule'], event['params'], timezone) if 'rrule' in event else (None, None, None)
+                yield {'time': event['time'], 'task': event.get('task', ""), 'url': event.get('url'), 'repeat': repeat, 'until': until, 'count': count}
+            event = None
+        elif name == 'DTSTART':
+            try:
+                event['time'] = from_ics_time(value, params, timezone)
+                event['params'] = params
+            except ValueError:
+                pass
+        elif name == 'SUMMARY':
+            event['task'] = ics_unescape(value).replace('\n', ' ').strip()
+        elif name == 'URL':
+            event['url'] = value
+        elif name == 'RRULE':
+            event['rrule'] = value
+
+def ics_unfold(lines):
+    '''
+    Yields logical lines, joining folded continuation lines.
+    '''
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+
+        if line[:1] in (' ', '\t') and current != None:
+            current += line[1:]
+            continue
+
+        if current:
+            yield current
+        current = line
+
+    if current:
+        yield current
+
+def ics_line(line: str) -> bytes:
+    '''
+    Returns a content line folded to 75 octets, without splitting UTF-8 characters.
+    '''
+    data = line.encode()
+
+    parts = []
+    while len(data) > 75:
+        end = 75 if not parts else 74
+        # back up to the start of a character
+        while data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[:end])
+        data = data[end:]
+    parts.append(data)
+
+    return b"\r\n ".join(parts) + b"\r\n"
+
+def ics_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def ics_unescape(text: str) -> str:
+    return re.sub(r'\\(.)', lambda x: '\n' if x[1] in 'nN' else x[1], text)
+
+def ics_time(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def from_ics_time(value: str, params: str, timezone: str = None) -> int:
+    '''
+    Returns an iCalendar DATE or DATE-TIME as a UTC epoch timestamp.
+    '''
+    value = value.strip()
+
+    # UTC time
+    if value.endswith(('Z', 'z')):
+        return to_timestamp(datetime.datetime.strptime(value[:-1], '%Y%m%dT%H%M%S').replace(tzinfo=datetime.timezone.utc))
+
+    # local time in TZID, falling back to the user's time zone
+    if match := re.search(r'TZID="?([^";:]+)', params, flags=re.I):
+        try:
+            get_zone(match[1])
+            timezone = match[1]
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            pass
+
+    if len(value) == 8:
+        date = datetime.datetime.strptime(value, '%Y%m%d')
+    else:
+        date = datetime.datetime.strptime(value, '%Y%m%dT%H%M%S')
+
+    return to_timestamp(date.replace(tzinfo=get_zone(timezone)) if timezone else date.astimezone())
+
+def to_rrule(rule: str) -> str | None:
+    '''
+    Returns a repeat rule as an iCalendar RRULE, or `None` if it cannot be expressed.
+    '''
+    if rule in REPEAT_WEEKDAYS:
+        return "FREQ=WEEKLY;BYDAY=" + ",".join(ICS_WEEKDAYS[i] for i in REPEAT_WEEKDAYS[rule])
+
+    if match := re.fullmatch(r'(\d+)(y|mo|w|d|h|m|s)', rule):
+        return f"FREQ={ICS_FREQUENCIES[match[2]]};INTERVAL={match[1]}"
+
+    # compound intervals, e.g. 1h30m
+    if (step := match_timedelta(rule)) and isinstance(step[0], timedelta) and step[0].total_seconds() % 1 == 0:
+        seconds = int(step[0].total_seconds())
+        for unit, size in (('d', 86400), ('h', 3600), ('m', 60), ('s', 1)):
+            if seconds % size == 0:
+                return f"FREQ={ICS_FREQUENCIES[unit]};INTERVAL={seconds // size}"
+
+    return None
+
+def from_rrule(value: str, params: str = "", timezone: str = None) -> tuple[str | None, int | None, int | None]:
+    '''
+    Parses an iCalendar RRULE. UNTIL without a time zone is read in the TZID of `params`, or the given IANA time zone.
+
+    BY* parts other than weekday/weekend BYDAY are ignored.
+
+    Returns
+        :class:`string` | `None`: repeat rule, `None` if it repeats too often.
+        :class:`int` | `None`: UTC epoch of the last possible occurrence (UNTIL).
+        :class:`int` | `None`: number of occurrences (COUNT).
+    '''
+    parts = dict(part.split('=', 1) for part in value.upper().split(';') if '=' in part)
+
+    until = count = None
+    try:
+        if 'UNTIL' in parts:
+            # a date includes the whole day
+            until = from_ics_time(parts['UNTIL'], params, timezone) + (86399 if len(parts['UNTIL'].strip()) == 8 else 0)
+        if 'COUNT' in parts:
+            count = int(parts['COUNT'])
+    except ValueError:
+        pass
+
+    units = {freq: unit for unit, freq in ICS_FREQUENCIES.items()}
+    if parts.get('FREQ') not in units:
+        return None, until, count
+
+    if parts['FREQ'] == 'WEEKLY' and 'BYDAY' in parts:
+        days = tuple(sorted(ICS_WEEKDAYS.index(day[-2:]) for day in parts['BYDAY'].split(',') if day[-2:] in ICS_WEEKDAYS))
+        for rule, weekdays in REPEAT_WEEKDAYS.items():
+            if days == weekdays:
+                return rule, until, count
+
+    rule = f"{parts.get('INTERVAL', '1')}{units[parts['FREQ']]}"
+
+    if not (step := match_timedelta(rule)) or (isinstance(step[0], timedelta) and step[0] < MIN_REPEAT_INTERVAL):
+        return None, until, count
+
+    return rule, until, count
+
+def expand_series(rule: str, time: int, now: int, until: int = None, count: int = None, timezone: str = None) -> list[int]:
+    '''
+    Returns the occurrences after `now` of a repeat rule starting at `time` that ends at `until` or after `count` occurrences,
+    at most ICS_MAX_OCCURRENCES. Times are UTC epochs, steps are taken in the given IANA time zone.
+    '''
+    start = occurrence = local_time(time, timezone)
+
+    # without a count, go straight to the first occurrence after `now`
+    if count == None and time <= now:
+        occurrence = next_occurrence(rule, start, local_time(now, timezone), start)
+
+    times = []
+    for n in itertools.count(1):
+        if (count != None and n > count) or (until != None and to_timestamp(occurrence) > until) or len(times) == ICS_MAX_OCCURRENCES:
+            break
+
+        if to_timestamp(occurrence) > now:
+            times.append(to_timestamp(occurrence))
+
+        occurrence = next_occurrence(rule, occurrence, occurrence, start)
+
+    return times
@@ -1,8 +1,25 @@
+import io
 import os
 from dotenv import load_dotenv
-import difflib
+import re
+import gzip
+import hashlib
+import json
+import time
+import heapq
+import bisect
+import asyncio
+import itertools
+import contextlib
+import contextvars
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass, asdict
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
+import aiohttp
+import numpy as np
+from PIL import Image
+from matplotlib.figure import Figure
 import urllib.parse
 
 load_dotenv()
@@ -13,10 +30,308 @@ AMERICA_URL = "https://americas.api.riotgames.com"
 NA_URL = "https://na1.api.riotgames.com"
 DD_URL = "https://ddragon.leagueoflegends.com"
 
+DD_CACHE_PATH = "cache/ddragon"
+MATCH_CACHE_PATH = "cache/matches"
+SPLASH_CACHE_PATH = "cache/splash"
+
+# splash art is downscaled to the width of a desktop embed image
+SPLASH_WIDTH = 960
+SPLASH_QUALITY = 80
+SPLASH_WORKERS = 2
+
+# transcoded splash art kept in memory, disk is only read after a restart
+SPLASH_MEMORY_BYTES = 64 * 1024**2
+
+# most match IDs returned per request
+MATCH_ID_PAGE_SIZE = 100
+
+# matches kept in memory / bytes stored on disk
+MATCH_CACHE_SIZE = 5000
+MATCH_CACHE_BYTES = 256 * 1024**2
+
+# seconds before a summoner is refreshed / a failed lookup is retried
+SUMMONER_TTL = 10 * 60
+SUMMONER_NEGATIVE_TTL = 60
+SUMMONER_CACHE_SIZE = 10000
+
+# queue name -> LeagueEntryDTO queueType
+QUEUES = {'solo': 'RANKED_SOLO_5x5', 'flex': 'RANKED_FLEX_SR'}
+TIERS = ('IRON', 'BRONZE', 'SILVER', 'GOLD', 'PLATINUM', 'EMERALD', 'DIAMOND', 'MASTER', 'GRANDMASTER', 'CHALLENGER')
+DIVISIONS = ('IV', 'III', 'II', 'I')
+
+# nickname -> champion ID
+CHAMPION_ALIASES = {
+    'mf': 'MissFortune', 'j4': 'JarvanIV', 'tf': 'TwistedFate', 'gp': 'Gangplank', 'lb': 'Leblanc',
+    'ww': 'Warwick', 'yi': 'MasterYi', 'tk': 'TahmKench', 'asol': 'AurelionSol', 'mundo': 'DrMundo',
+    'kog': 'KogMaw', 'xin': 'XinZhao', 'heimer': 'Heimerdinger', 'cass': 'Cassiopeia', 'kass': 'Kassadin',
+    'fiddle': 'Fiddlesticks', 'naut': 'Nautilus', 'voli': 'Volibear', 'morg': 'Morgana', 'blitz': 'Blitzcrank',
+    'cait': 'Caitlyn', 'ez': 'Ezreal', 'kat': 'Katarina', 'malph': 'Malphite', 'nid': 'Nidalee',
+    'ori': 'Orianna', 'sej': 'Sejuani', 'trist': 'Tristana', 'trynd': 'Tryndamere', 'vlad': 'Vladimir',
+    'wu': 'MonkeyKing', 'nunu': 'Nunu', 'rek': 'RekSai', 'reksai': 'RekSai', 'belveth': 'Belveth',
+}
+
+MIN_TRIGRAM_SCORE = 0.2
+
+MAX_CONNECTIONS = 20
+KEEPALIVE_TIMEOUT = 60
+TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3)
+
+session: aiohttp.ClientSession = None
+
+# dev key limits until the API reports the real ones
+DEFAULT_APP_RATE_LIMIT = "20:1,100:120"
+RATE_LIMIT_RETRIES = 3
+MAX_RATE_LIMIT_WAIT = 10
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# share of every rate limit window background requests leave free for interactive ones
+BACKGROUND_RESERVE = 0.25
+
+priority = contextvars.ContextVar('priority', default=INTERACTIVE)
+
+# HTTP
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
+
+def get_session() -> aiohttp.ClientSession:
+    '''
+    Returns the shared HTTP session, creating it on first use.\n
+    All requests share one keep-alive connection pool.
+    '''
+    global session
+
+    if session == None or session.closed:
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, keepalive_timeout=KEEPALIVE_TIMEOUT, ttl_dns_cache=300)
+        session = aiohttp.ClientSession(connector=connector, timeout=TIMEOUT)
+
+    return session
+
+async def close():
+    '''
+    Closes the shared HTTP session.
+    '''
+    global session
+
+    if session != None:
+        await session.close()
+        session = None
+
+async def get(url: str, params: dict = None, method: str = None) -> dict | list | None:
+    '''
+    GET a JSON resource.\n
+    Riot API requests are authenticated with the X-Riot-Token header and rate limited per host and `method` (default: URL path).
+    Interactive requests raise RateLimited rather than wait more than MAX_RATE_LIMIT_WAIT seconds, see :func:`background`.\n
+    Returns: the decoded JSON, or None if the request failed.
+    '''
+    if url.startswith(DD_URL):
+        try:
+            async with get_session().get(url, params=params) as resp:
+                if resp.status == 200:
+                    return await resp.json()
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"riot: request failed ({url}: {e!r})")
+
+        return None
+
+    url = urllib.parse.urlsplit(url)
+    host, method = url.netloc, method or url.path
+    max_wait = MAX_RATE_LIMIT_WAIT if priority.get() == INTERACTIVE else None
+
+    for _ in range(RATE_LIMIT_RETRIES + 1):
+        await limiter.acquire(host, method, priority.get(), max_wait)
+
+        try:
+            async with get_session().get(url.geturl(), params=params, headers={'X-Riot-Token': API_KEY}) as resp:
+                limiter.update(host, method, resp.headers)
+
+                if resp.status == 200:
+                    return await resp.json()
+                if resp.status != 429:
+                    return None
+
+                retry_after = limiter.block(host, method, resp.headers)
+                print(f"riot: rate limited on {host} ({method}), retrying after {retry_after:.0f}s")
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"riot: request failed ({url.geturl()}: {e!r})")
+            return None
+
+    raise RateLimited(retry_after)
+
+async def get_bytes(url: str) -> bytes | None:
+    '''
+    GET a binary resource, e.g. an image.\n
+    Returns: the response body, or None if the request failed.
+    '''
+    try:
+        async with get_session().get(url) as resp:
+            if resp.status == 200:
+                return await resp.read()
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"riot: request failed ({url}: {e!r})")
+
+# Rate Limits
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
+
+class RateLimited(Exception):
+    '''
+    Raised when a Riot API request cannot be made within the allowed wait.
+    '''
+    def __init__(self, retry_after: float):
+        super().__init__(f"Riot API rate limit exceeded, retry after {retry_after:.0f}s.")
+        self.retry_after = retry_after
+
+class Bucket():
+    '''
+    Sliding window rate limit, e.g. "20:1,100:120" is 20 requests per second and 100 requests per 2 minutes.
+    '''
+    def __init__(self, header: str = None):
+        self.header = None
+        self.limits: list[tuple[int, int]] = []
+        self.requests = deque()
+        self.blocked = 0
+
+        if header:
+            self.set_limits(header)
+
+    def set_limits(self, header: str):
+        '''
+        Sets the limits from an X-*-Rate-Limit header.
+        '''
+        if header != self.header:
+            self.header = header
+            self.limits = [(int(count), int(window)) for count, window in (limit.split(":") for limit in header.split(","))]
+
+    def delay(self, now: float, share: float = 1) -> float:
+        '''
+        Returns the number of seconds until a request can be made, using at most `share` of each limit.
+        '''
+        # forget requests outside the longest window
+        window = max((window for _, window in self.limits), default=0)
+        while self.requests and self.requests[0] <= now - window:
+            self.requests.popleft()
+
+        delay = self.blocked - now
+        for count, window in self.limits:
+            count = max(1, int(count * share))
+            # wait for the count-th most recent request to leave the window
+            if len(self.requests) >= count:
+                delay = max(delay, self.requests[-count] + window - now)
+
+        return max(delay, 0)
+
+class RateLimiter():
+    '''
+    Client side Riot API rate limiter.\n
+    Keeps an app bucket per routing host and a method bucket per host and method, learning their limits from response headers.
+    Requests wait in a priority queue per host, so interactive commands go ahead of background refreshes.
+    '''
+    def __init__(self):
+        self.apps: dict[str, Bucket] = {}
+        self.methods: dict[tuple[str, str], Bucket] = {}
+        self.queues: dict[str, list[tuple[int, int]]] = {}
+        self.conditions: dict[str, asyncio.Condition] = {}
+        self.counter = itertools.count()
+
+    async def acquire(self, host: str, method: str, priority: int = INTERACTIVE, max_wait: float = None):
+        '''
+        Waits until a request can be made, then records it.\n
+        Raises RateLimited if the request would wait longer than `max_wait` seconds.
+        '''
+        app = self.apps.setdefault(host, Bucket(DEFAULT_APP_RATE_LIMIT))
+        bucket = self.methods.setdefault((host, method), Bucket())
+        queue = self.queues.setdefault(host, [])
+        condition = self.conditions.setdefault(host, asyncio.Condition())
+
+        entry = (priority, next(self.counter))
+        share = 1 if priority == INTERACTIVE else 1 - BACKGROUND_RESERVE
+
+        async with condition:
+            heapq.heappush(queue, entry)
+            condition.notify_all()
+
+            try:
+                while True:
+                    timeout = None
+
+                    # only the first request in the queue may go
+                    if queue[0] == entry:
+                        if (delay := max(app.delay(time.monotonic(), share), bucket.delay(time.monotonic(), share))) <= 0:
+                            break
+                        if max_wait != None and delay > max_wait:
+                            raise RateLimited(delay)
+                        timeout = delay
+
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+
+                now = time.monotonic()
+                app.requests.append(now)
+                bucket.requests.append(now)
+
+            finally:
+                queue.remove(entry)
+                heapq.heapify(queue)
+                condition.notify_all()
+
+    def update(self, host: str, method: str, headers):
+        '''
+        Learns the app and method limits from response headers.
+        '''
+        if header := headers.get('X-App-Rate-Limit'):
+            self.apps[host].set_limits(header)
+        if header := headers.get('X-Method-Rate-Limit'):
+            self.methods[(host, method)].set_limits(header)
+
+    def block(self, host: str, method: str, headers) -> float:
+        '''
+        Blocks the exceeded bucket after a 429 response for Retry-After seconds.\n
+        Returns: the number of seconds blocked
+        '''
+        retry_after = float(headers.get('Retry-After', 1))
+
+        if headers.get('X-Rate-Limit-Type') == 'application':
+            self.apps[host].blocked = time.monotonic() + retry_after
+        else:
+            self.methods[(host, method)].blocked = time.monotonic() + retry_after
+
+        return retry_after
+
+    def rate(self, host: str, method: str) -> float:
+        '''
+        Returns the sustained requests per second the app and method limits allow, the tightest of their windows.
+        '''
+        buckets = [self.apps.get(host) or Bucket(DEFAULT_APP_RATE_LIMIT), self.methods.get((host, method))]
+        return min(count / window for bucket in buckets if bucket for count, window in bucket.limits)
+
+limiter = RateLimiter()
+
+def get_rate(url: str, method: str) -> float:
+    '''
+    Returns the sustained requests per second allowed for a Riot API URL and method, see :func:`RateLimiter.rate`.
+    '''
+    return limiter.rate(urllib.parse.urlsplit(url).netloc, method)
+
+@contextlib.contextmanager
+def background():
+    '''
+    Queues Riot API requests made in this context behind interactive ones, without a wait limit.
+    '''
+    token = priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        priority.reset(token)
+
 # Riot API
 #--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
 
-def get_account_by_name(gameName: str, tagLine: str) -> dict | None:
+async def get_account_by_name(gameName: str, tagLine: str) -> dict | None:
     '''
     Get Riot account by Riot ID.\n
     Returns: AccountDto
@@ -24,175 +339,928 @@ def get_account_by_name(gameName: str, tagLine: str) -> dict | None:
     gameName = urllib.parse.quote(gameName)
 
     url = AMERICA_URL + f"/riot/account/v1/accounts/by-riot-id/{gameName}/{tagLine}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
+    return await get(url, method="account-v1.by-riot-id")
 
-    if resp.status_code == 200:
-        return resp.json()
-
-def get_account_by_puuid(puuid: str) -> dict | None:
+async def get_account_by_puuid(puuid: str) -> dict | None:
     '''
     Get Riot account by puuid.\n
     Returns: AccountDto
     '''
     url = AMERICA_URL + f"/riot/account/v1/accounts/by-puuid/{puuid}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
-
-    if resp.status_code == 200:
-        return resp.json()   
+    return await get(url, method="account-v1.by-puuid")
 
-def get_summoner_by_name(gameName: str, tagLine: str) -> dict | None:
+async def get_summoner_by_name(gameName: str, tagLine: str) -> dict | None:
     '''
     Get summoner by Riot ID.\n
     Returns: merge(SummonerDTO, AccountDto)
     '''
-    if not (account := get_account_by_name(gameName, tagLine)):
+    if not (account := await get_account_by_name(gameName, tagLine)):
         return None
     
     puuid = account['puuid']
 
     url = NA_URL + f"/lol/summoner/v4/summoners/by-puuid/{puuid}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
 
-    if resp.status_code == 200:
-        summoner = resp.json()
+    if summoner := await get(url, method="summoner-v4.by-puuid"):
         summoner.update(account)
         return summoner
     
-def get_summoner_by_puuid(puuid: str) -> dict | None:
+async def get_summoner_by_puuid(puuid: str) -> dict | None:
     '''
     Get summoner by puuid.\n
     Returns: merge(SummonerDTO, AccountDto)
     '''
-    if not (account := get_account_by_puuid(puuid)):
-        return None
-
     url = NA_URL + f"/lol/summoner/v4/summoners/by-puuid/{puuid}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
 
-    if resp.status_code == 200:
-        summoner = resp.json()
+    # both requests only need the puuid
+    account, summoner = await asyncio.gather(get_account_by_puuid(puuid), get(url, method="summoner-v4.by-puuid"))
+
+    if account and summoner:
         summoner.update(account)
         return summoner
 
-def get_stats_by_summoner(summonerId: str) -> list[dict] | None:
+async def get_stats_by_summoner(summonerId: str) -> list[dict] | None:
     '''
     Get summoner stats.\n
     Returns: list[LeagueEntryDTO]
     '''
     url = NA_URL + f"/lol/league/v4/entries/by-summoner/{summonerId}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
-
-    if resp.status_code == 200:
-        return resp.json()
+    return await get(url, method="league-v4.by-summoner")
     
-def get_matchId_by_puuid(puuid: str, count: int = 20) -> list | None:
+async def get_matchId_by_puuid(puuid: str, count: int = 20, start: int = 0) -> list | None:
     '''
-    Get match IDs.\n
+    Get match IDs, most recent first.\n
+    Counts over MATCH_ID_PAGE_SIZE are fetched a page at a time.\n
     Returns: list[str]
     '''
-    url = AMERICA_URL + f"/lol/match/v5/matches/by-puuid/{puuid}/ids?start=0&count={count}"
-    resp = requests.get(url + f"&api_key={API_KEY}")
+    url = AMERICA_URL + f"/lol/match/v5/matches/by-puuid/{puuid}/ids"
+
+    matchIds = []
+    while len(matchIds) < count:
+        size = min(count - len(matchIds), MATCH_ID_PAGE_SIZE)
 
-    if resp.status_code == 200:
-        return resp.json()
+        if (page := await get(url, params={'start': start + len(matchIds), 'count': size}, method="match-v5.ids-by-puuid")) == None:
+            return matchIds or None
+        matchIds += page
+
+        # no older matches
+        if len(page) < size:
+            break
+
+    return matchIds
     
-def get_match_by_id(matchId: str) -> dict | None:
+async def get_match_by_id(matchId: str) -> "MatchSummary | None":
     '''
-    Get match info by match ID.\n
-    Returns: MatchDto
+    Get match info by match ID, see :class:`MatchCache`.\n
+    Returns: MatchSummary
     '''
-    url = AMERICA_URL + f"/lol/match/v5/matches/{matchId}"
-    resp = requests.get(url + f"?api_key={API_KEY}")
-
-    if resp.status_code == 200:
-        return resp.json()
+    return await matches.get(matchId)
     
-def get_champion_masteries_by_puuid(puuid: str, count = 3) -> list[dict] | None:
+async def get_champion_masteries_by_puuid(puuid: str, count = 3) -> list[dict] | None:
     '''
     Get top champion masteries for a summoner by puuid.
     '''
-    url = NA_URL + f"/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}/top?count=3"
-    resp = requests.get(url + f"&api_key={API_KEY}")
+    url = NA_URL + f"/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}/top"
+    return await get(url, params={'count': 3}, method="champion-mastery-v4.top-by-puuid")
+
+# Match Cache
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
+
+@dataclass(slots=True)
+class ParticipantSummary():
+    '''
+    The fields of a ParticipantDto that are rendered or aggregated.
+    '''
+    puuid: str
+    teamId: int
+    win: bool
+    championId: int
+    championName: str
+    teamPosition: str
+    kills: int
+    deaths: int
+    assists: int
+    totalMinionsKilled: int
+    neutralMinionsKilled: int
+    goldEarned: int
+
+    @classmethod
+    def from_dto(cls, dto: dict) -> "ParticipantSummary":
+        return cls(**{field: dto.get(field) for field in cls.__dataclass_fields__})
+
+@dataclass(slots=True)
+class TeamSummary():
+    '''
+    The fields of a TeamDto that are rendered or aggregated.
+    '''
+    teamId: int
+    win: bool
+    kills: int
+
+    @classmethod
+    def from_dto(cls, dto: dict) -> "TeamSummary":
+        return cls(teamId=dto['teamId'], win=dto['win'], kills=dto['objectives']['champion']['kills'])
+
+@dataclass(slots=True)
+class MatchSummary():
+    '''
+    Compact projection of a MatchDto, about 1 KB in memory instead of tens of KB of nested dicts.
+    '''
+    matchId: str
+    queueId: int
+    gameMode: str
+    gameCreation: int
+    gameDuration: int
+    teams: tuple[TeamSummary, ...]
+    participants: tuple[ParticipantSummary, ...]
+
+    @classmethod
+    def from_dto(cls, dto: dict) -> "MatchSummary":
+        '''
+        Projects a MatchDto.
+        '''
+        info = dto['info']
+        return cls(matchId=dto['metadata']['matchId'], queueId=info.get('queueId'), gameMode=info['gameMode'],
+                   gameCreation=info['gameCreation'], gameDuration=info['gameDuration'],
+                   teams=tuple(TeamSummary.from_dto(team) for team in info['teams']),
+                   participants=tuple(ParticipantSummary.from_dto(participant) for participant in info['participants']))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MatchSummary":
+        '''
+        Loads a projection saved with :func:`dataclasses.asdict`, or projects a saved MatchDto.
+        '''
+        if 'metadata' in data:
+            return cls.from_dto(data)
+
+        return cls(**data | {'teams': tuple(TeamSummary(**team) for team in data['teams']),
+                             'participants': tuple(ParticipantSummary(**participant) for participant in data['participants'])})
+
+    def participant(self, puuid: str) -> ParticipantSummary | None:
+        for participant in self.participants:
+            if participant.puuid == puuid:
+                return participant
+
+    def team(self, teamId: int) -> TeamSummary | None:
+        for team in self.teams:
+            if team.teamId == teamId:
+                return team
+
+class MatchCache():
+    '''
+    Match cache keyed by match ID, holding :class:`MatchSummary` projections.\n
+    Matches never change once played, so entries never expire. Recently used matches are kept in memory (LRU),
+    all matches are stored gzip compressed under `path` until the store exceeds `max_bytes` and the least recently used are evicted.
+    '''
+    def __init__(self, path: str = MATCH_CACHE_PATH, size: int = MATCH_CACHE_SIZE, max_bytes: int = MATCH_CACHE_BYTES):
+        self.path = path
+        self.size = size
+        self.max_bytes = max_bytes
+
+        self.memory: OrderedDict[str, MatchSummary] = OrderedDict()
+        # match ID -> file size, least recently used first
+        self.files: OrderedDict[str, int] = None
+        self.bytes = 0
+        self.lock = asyncio.Lock()
+
+        # requests in flight, so concurrent lookups of a match share one request
+        self.pending: dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    async def get(self, matchId: str) -> MatchSummary | None:
+        '''
+        Returns a match from memory, disk or the Riot API, in that order.
+        '''
+        if match := self.memory.get(matchId):
+            self.memory.move_to_end(matchId)
+            self.hits += 1
+            return match
+
+        if matchId not in self.pending:
+            self.pending[matchId] = asyncio.create_task(self.load(matchId))
+            self.pending[matchId].add_done_callback(lambda _: self.pending.pop(matchId, None))
+
+        return await asyncio.shield(self.pending[matchId])
+
+    async def load(self, matchId: str) -> MatchSummary | None:
+        await self.index()
+        path = self.file(matchId)
+
+        if matchId in self.files and (data := await asyncio.to_thread(read_file, path)):
+            match = MatchSummary.from_dict(json.loads(gzip.decompress(data)))
+            self.disk_hits += 1
+
+            # the file may have been evicted by another lookup during the read
+            if matchId in self.files:
+                self.files.move_to_end(matchId)
+
+                # keep the file's access order across restarts
+                with contextlib.suppress(FileNotFoundError):
+                    await asyncio.to_thread(os.utime, path)
+
+        else:
+            url = AMERICA_URL + f"/lol/match/v5/matches/{matchId}"
+            if not (match := await get(url, method="match-v5.by-id")):
+                return None
+            self.misses += 1
+
+            match = MatchSummary.from_dto(match)
+            data = await asyncio.to_thread(lambda: gzip.compress(json.dumps(asdict(match), separators=(",", ":")).encode()))
+            await asyncio.to_thread(write_file, path, data)
+
+            if evicted := self.add_file(matchId, len(data)):
+                await asyncio.to_thread(remove_files, evicted)
+
+        self.memory[matchId] = match
+        if len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+        return match
+
+    async def index(self):
+        '''
+        Lists the stored matches on first use, least recently used first.
+        '''
+        async with self.lock:
+            if self.files != None:
+                return
+
+            def scan():
+                if not os.path.isdir(self.path):
+                    return []
+                return [(entry.name.removesuffix(".json.gz"), entry.stat()) for entry in os.scandir(self.path) if entry.name.endswith(".json.gz")]
+
+            self.files = OrderedDict((matchId, stat.st_size) for matchId, stat in sorted(await asyncio.to_thread(scan), key=lambda x: x[1].st_mtime))
+            self.bytes = sum(self.files.values())
+
+    def add_file(self, matchId: str, size: int) -> list[str]:
+        '''
+        Records a stored match, evicting the least recently used matches over `max_bytes`.\n
+        Returns: the paths of the evicted files
+        '''
+        self.bytes += size - self.files.pop(matchId, 0)
+        self.files[matchId] = size
+
+        evicted = []
+        while self.bytes > self.max_bytes and len(self.files) > 1:
+            oldest, size = self.files.popitem(last=False)
+            self.bytes -= size
+            evicted.append(self.file(oldest))
+
+        return evicted
+
+    def file(self, matchId: str) -> str:
+        return os.path.join(self.path, f"{matchId}.json.gz")
+
+    def stats(self) -> dict:
+        '''
+        Returns hit/miss counts and cache sizes.
+        '''
+        return {
+            'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+            'memory': len(self.memory), 'files': len(self.files or ()), 'bytes': self.bytes,
+        }
+
+matches = MatchCache()
+
+# Summoner Cache
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
+
+class SummonerCache():
+    '''
+    Summoner cache keyed by puuid and by Riot ID.\n
+    Entries older than `ttl` seconds are returned right away while a background refresh runs (stale-while-revalidate).
+    Failed lookups are cached for `negative_ttl` seconds. `on_update` is called with every freshly fetched summoner.
+    '''
+    def __init__(self, ttl: float = SUMMONER_TTL, negative_ttl: float = SUMMONER_NEGATIVE_TTL, size: int = SUMMONER_CACHE_SIZE, on_update = None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.size = size
+        self.on_update = on_update
+
+        # key -> (fetch time, summoner or None)
+        self.entries: OrderedDict[str, tuple[float, dict | None]] = OrderedDict()
+        # key -> fetch in flight
+        self.pending: dict[str, asyncio.Task] = {}
+
+    async def get_by_puuid(self, puuid: str) -> dict | None:
+        '''
+        Get summoner by puuid.\n
+        Returns: merge(SummonerDTO, AccountDto)
+        '''
+        return await self.get(f"puuid:{puuid}", lambda: get_summoner_by_puuid(puuid))
+
+    async def get_by_name(self, gameName: str, tagLine: str) -> dict | None:
+        '''
+        Get summoner by Riot ID.\n
+        Returns: merge(SummonerDTO, AccountDto)
+        '''
+        return await self.get(riot_id_key(gameName, tagLine), lambda: get_summoner_by_name(gameName, tagLine))
+
+    async def get(self, key: str, fetch) -> dict | None:
+        if entry := self.entries.get(key):
+            self.entries.move_to_end(key)
+            fetched, summoner = entry
+            age = time.monotonic() - fetched
+
+            if summoner == None and age < self.negative_ttl:
+                return None
+
+            if summoner != None:
+                # serve stale entries, refreshing in the background
+                if age >= self.ttl and key not in self.pending:
+                    self.start(key, fetch, BACKGROUND)
+                return summoner
+
+        if key not in self.pending:
+            self.start(key, fetch, INTERACTIVE)
+
+        return await asyncio.shield(self.pending[key])
+
+    def start(self, key: str, fetch, level: int):
+        '''
+        Starts fetching an entry.
+        '''
+        async def refresh():
+            token = priority.set(level)
+            try:
+                summoner = await fetch()
+            except RateLimited:
+                # keep serving the stale entry
+                if level == BACKGROUND:
+                    return None
+                raise
+            finally:
+                priority.reset(token)
+
+            self.put(key, summoner)
+            return summoner
+
+        self.pending[key] = task = asyncio.create_task(refresh())
+        task.add_done_callback(lambda _: self.pending.pop(key, None))
+
+        # background refreshes are never awaited
+        if level == BACKGROUND:
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    def put(self, key: str, summoner: dict | None):
+        '''
+        Stores a summoner under its puuid and Riot ID, or a failed lookup under `key`.
+        '''
+        now = time.monotonic()
+
+        if summoner == None:
+            self.entries[key] = (now, None)
+        else:
+            for alias in (key, f"puuid:{summoner['puuid']}", riot_id_key(summoner['gameName'], summoner['tagLine'])):
+                self.entries[alias] = (now, summoner)
+                self.entries.move_to_end(alias)
+
+            if self.on_update:
+                self.on_update(summoner)
+
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+def riot_id_key(gameName: str, tagLine: str) -> str:
+    # Riot IDs are case insensitive
+    return f"riot-id:{gameName.strip().lower()}#{tagLine.strip().lower()}"
+
+summoners = SummonerCache()
+
+# Leaderboard
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
+
+class Standings():
+    '''
+    League entries sorted by tier, division and LP, highest first.\n
+    Updating an entry is a bisect of the sorted order, reading the standings is a scan.
+    '''
+    def __init__(self):
+        # (rank key, key), ascending
+        self.order: list[tuple[tuple, str]] = []
+        # key -> LeagueEntryDTO
+        self.entries: dict[str, dict] = {}
 
-    if resp.status_code == 200:
-        return resp.json()
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __iter__(self):
+        '''
+        Yields (key, LeagueEntryDTO) from first to last place.
+        '''
+        for _, key in self.order:
+            yield key, self.entries[key]
+
+    def update(self, key: str, entry: dict | None):
+        '''
+        Sets the entry of `key`, or removes it if `entry` is None.
+        '''
+        if key in self.entries:
+            del self.order[bisect.bisect_left(self.order, (rank_key(self.entries.pop(key)), key))]
+
+        if entry:
+            self.entries[key] = entry
+            bisect.insort(self.order, (rank_key(entry), key))
+
+def rank_key(entry: dict) -> tuple:
+    '''
+    Returns the sort key of a LeagueEntryDTO, ascending keys are higher ranks.
+    '''
+    tier = TIERS.index(entry['tier']) if entry.get('tier') in TIERS else -1
+    division = DIVISIONS.index(entry['rank']) if entry.get('rank') in DIVISIONS else -1
+    return (-tier, -division, -entry.get('leaguePoints', 0), -entry.get('wins', 0))
+
+def get_queue_entry(stats: list[dict], queue: str) -> dict | None:
+    '''
+    Returns the LeagueEntryDTO of a queue, e.g. "solo", from a summoner's stats.
+    '''
+    for entry in stats:
+        if entry.get('queueType') == QUEUES[queue]:
+            return entry
 
 # Data Dragon
 #--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
 
-def get_dd_version() -> str | None:
+class DataDragon():
     '''
-    Returns the latest Data Dragon version.
+    Data Dragon cache keyed by version.\n
+    Parsed champion data is kept in memory, raw files are stored under `{path}/{version}/` so warm restarts need no network.
+    '''
+    def __init__(self, path: str = DD_CACHE_PATH):
+        self.path = path
+        self.version: str = None
+        self.lock = asyncio.Lock()
+
+        # champion ID -> champion summary (champion.json)
+        self.champions: dict[str, dict] = {}
+        # champion key -> champion ID
+        self.keys: dict[str, str] = {}
+        # champion ID -> champion details (champion/{id}.json)
+        self.details: dict[str, dict] = {}
+
+        # normalized name/ID/alias -> champion ID
+        self.names: dict[str, str] = {}
+        # trigram -> normalized names containing it
+        self.trigrams: dict[str, set[str]] = {}
+
+    async def update(self) -> bool:
+        '''
+        Checks the latest version and loads its champions if the version changed.\n
+        Falls back to the newest version on disk if Data Dragon is unreachable.\n
+        Returns: True if a version is loaded
+        '''
+        async with self.lock:
+            if not (versions := await get(DD_URL + "/api/versions.json")):
+                versions = await asyncio.to_thread(self.cached_versions)
+
+            for version in versions[:1]:
+                if version != self.version and (champions := await self.fetch(version, "data/en_US/champion.json")):
+                    self.champions = champions['data']
+                    self.keys = {champion['key']: id for id, champion in self.champions.items()}
+                    self.details = {}
+                    self.version = version
+                    self.index()
+
+            return self.version != None
+
+    async def ready(self) -> bool:
+        '''
+        Loads a version if none is loaded yet.
+        '''
+        return self.version != None or await self.update()
+
+    async def fetch(self, version: str, file: str) -> dict | None:
+        '''
+        Returns a Data Dragon JSON file, reading it from disk if cached.
+        '''
+        path = os.path.join(self.path, version, file)
+
+        if data := await asyncio.to_thread(read_file, path):
+            return json.loads(data)
+
+        if not (data := await get_bytes(DD_URL + f"/cdn/{version}/{file}")):
+            return None
+
+        await asyncio.to_thread(write_file, path, data)
+        return json.loads(data)
+
+    def cached_versions(self) -> list[str]:
+        '''
+        Returns the versions stored on disk, newest first.
+        '''
+        if not os.path.isdir(self.path):
+            return []
+
+        versions = [version for version in os.listdir(self.path) if os.path.exists(os.path.join(self.path, version, "data/en_US/champion.json"))]
+        return sorted(versions, key=lambda x: [int(part) if part.isdigit() else 0 for part in x.split(".")], reverse=True)
+
+    def index(self):
+        '''
+        Builds the name and trigram indexes for the loaded champions.
+        '''
+        self.names = {}
+        for id, champion in self.champions.items():
+            self.names[normalize(id)] = id
+            self.names[normalize(champion['name'])] = id
+        for alias, id in CHAMPION_ALIASES.items():
+            if id in self.champions:
+                self.names.setdefault(alias, id)
+        self.names = dict(sorted(self.names.items()))
+
+        self.trigrams = {}
+        for name in self.names:
+            for trigram in trigrams(name):
+                self.trigrams.setdefault(trigram, set()).add(name)
+
+    def search(self, query: str, limit: int = 25) -> list[str]:
+        '''
+        Returns the IDs of the champions best matching a name, nickname or prefix, best first.
+        '''
+        if not (query := normalize(query)):
+            return sorted(self.champions, key=lambda x: self.champions[x]['name'])[:limit]
+
+        # exact, then prefix, then substring matches
+        ids = {}
+        if id := self.names.get(query):
+            ids[id] = None
+        for name in self.names:
+            if name.startswith(query):
+                ids.setdefault(self.names[name])
+        for name in self.names:
+            if query in name:
+                ids.setdefault(self.names[name])
+
+        # typo tolerant matches by shared trigrams
+        for id in self.fuzzy(query):
+            ids.setdefault(id)
+
+        return list(ids)[:limit]
+
+    def fuzzy(self, query: str) -> list[str]:
+        '''
+        Returns the IDs of the champions sharing enough trigrams with a normalized name, best first.
+        '''
+        grams = trigrams(query)
+        counts = Counter(name for trigram in grams for name in self.trigrams.get(trigram, ()))
+
+        # jaccard similarity of the trigram sets
+        scores = {}
+        for name, count in counts.items():
+            score = count / (len(grams) + len(trigrams(name)) - count)
+            if score >= MIN_TRIGRAM_SCORE:
+                id = self.names[name]
+                scores[id] = max(score, scores.get(id, 0))
+
+        return sorted(scores, key=lambda x: -scores[x])
+
+    def get_champion_by_id(self, championId: int | str) -> dict | None:
+        '''
+        Get champion summary by key, e.g. 266.
+        '''
+        if id := self.keys.get(str(championId)):
+            return self.champions[id]
+
+    def get_champion_name(self, championName: str) -> str | None:
+        '''
+        Get the closest champion ID by name or nickname.
+        '''
+        if id := self.names.get(normalize(championName)):
+            return id
+
+        if ids := self.fuzzy(normalize(championName)):
+            return ids[0]
+
+    async def get_champion_details(self, id: str) -> dict | None:
+        '''
+        Get champion details by ID, e.g. "Aatrox".
+        '''
+        if id not in self.details and (resp := await self.fetch(self.version, f"data/en_US/champion/{id}.json")):
+            self.details[id] = resp['data'][id]
+
+        return self.details.get(id)
+
+def normalize(name: str) -> str:
+    '''
+    Returns a champion name in lowercase without spaces or punctuation, e.g. "Kai'Sa" -> "kaisa".
+    '''
+    return re.sub(r'[^0-9a-z]', '', name.lower())
+
+def trigrams(name: str) -> set[str]:
     '''
-    resp = requests.get(DD_URL + "/api/versions.json")
+    Returns the trigrams of a normalized name, padded so short names and prefixes have trigrams too.
+    '''
+    name = f"  {name} "
+    return {name[i:i+3] for i in range(len(name) - 2)}
+
+def read_file(path: str) -> bytes | None:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def write_file(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
 
-    if resp.status_code == 200:
-        return resp.json()[0]
+    # write to a temporary file first so a partial download is never read back
+    with open(path + ".tmp", 'wb') as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
 
-def get_summoner_icon(iconId: int | str) -> str | None:
+def remove_files(paths: list[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+ddragon = DataDragon()
+
+async def get_dd_version() -> str | None:
+    '''
+    Returns the latest Data Dragon version.
+    '''
+    if await ddragon.ready():
+        return ddragon.version
+
+async def get_summoner_icon(iconId: int | str) -> str | None:
     '''
     Returns summoner icon link.
     '''
-    if not (version := get_dd_version()):
+    if not (version := await get_dd_version()):
         return
     
     return DD_URL + f"/cdn/{version}/img/profileicon/{iconId}.png"
 
-def get_champions() -> dict | None:
+async def get_champions() -> dict | None:
     '''
     Get champions.
     '''
-    if not (version := get_dd_version()):
-        return
+    if await ddragon.ready():
+        return ddragon.champions
     
-    url = DD_URL + f"/cdn/{version}/data/en_US/champion.json"
-    resp = requests.get(url)
-
-    if resp.status_code == 200:
-        return resp.json()['data']
+async def get_champion_by_id(championId: int | str) -> dict | None:
+    '''
+    Get champion by ID.\n
+    Returns: champion summary from champion.json
+    '''
+    if await ddragon.ready():
+        return ddragon.get_champion_by_id(championId)
     
-def get_champion_by_id(championId: int | str) -> dict | None:
+async def get_champion_by_name(championName: str) -> dict | None:
     '''
-    Get champion by ID.
+    Get champion by name.
     '''
-    if not (version := get_dd_version()):
+    if not await ddragon.ready():
         return
 
-    if not (champions := get_champions()):
+    if not (championName := ddragon.get_champion_name(championName)):
         return
     
-    if not (championName := [champion['id'] for champion in champions.values() if champion['key'] == str(championId)]):
-        return
+    return await ddragon.get_champion_details(championName)
     
-    url = DD_URL + f"/cdn/{version}/data/en_US/champion/{championName[0]}.json"
-    resp = requests.get(url)
+async def get_champion_skins_by_name(championName: str) -> list[dict]:
+    '''
+    Get champion skins by name.
+    '''
+    if champion := await get_champion_by_name(championName):
+        return [skin | {'champion': champion['id'], 'url': DD_URL + f"/cdn/img/champion/splash/{champion['id']}_{skin['num']}.jpg"} for skin in champion['skins']]
 
-    if resp.status_code == 200:
-        return resp.json()['data'][championName[0]]
-    
-def get_champion_by_name(championName: str) -> dict | None:
+# Splash Art
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
+
+# transcoding is CPU bound, Pillow releases the GIL while resizing and encoding
+splash_executor = ThreadPoolExecutor(max_workers=SPLASH_WORKERS, thread_name_prefix="splash")
+
+# cache key -> transcode in flight
+splash_pending: dict[str, asyncio.Task] = {}
+
+# cache key -> WebP bytes, least recently used first
+splash_memory: OrderedDict[str, bytes] = OrderedDict()
+splash_bytes = 0
+
+async def get_splash(skin: dict) -> bytes | None:
     '''
-    Get champion by name.
+    Get a skin's splash art downscaled to SPLASH_WIDTH and encoded as WebP.\n
+    Results are stored under a content address of (champion, skin num, DD version, width), so each image is transcoded once.
+    Recently used images are served from memory, up to SPLASH_MEMORY_BYTES.
     '''
-    if not (version := get_dd_version()):
-        return
+    key = hashlib.sha1(f"{skin['champion']}:{skin['num']}:{ddragon.version}:{SPLASH_WIDTH}".encode()).hexdigest()
 
-    if not (champions := get_champions()):
-        return
-    
-    if not (championName := difflib.get_close_matches(championName, champions.keys(), 1)):
-        return
-    
-    url = DD_URL + f"/cdn/{version}/data/en_US/champion/{championName[0]}.json"
-    resp = requests.get(url)
+    if data := splash_memory.get(key):
+        splash_memory.move_to_end(key)
+        return data
 
-    if resp.status_code == 200:
-        return resp.json()['data'][championName[0]]
-    
-def get_champion_skins_by_name(championName: str) -> list[dict]:
+    if key not in splash_pending:
+        splash_pending[key] = asyncio.create_task(load_splash(key, skin['url']))
+        splash_pending[key].add_done_callback(lambda _: splash_pending.pop(key, None))
+
+    return await asyncio.shield(splash_pending[key])
+
+async def load_splash(key: str, url: str) -> bytes | None:
+    path = os.path.join(SPLASH_CACHE_PATH, key[:2], key + ".webp")
+
+    if data := await asyncio.to_thread(read_file, path):
+        remember_splash(key, data)
+        return data
+
+    if not (data := await get_bytes(url)):
+        return None
+
+    try:
+        data = await asyncio.get_running_loop().run_in_executor(splash_executor, transcode, data, SPLASH_WIDTH, SPLASH_QUALITY)
+    except OSError as e:
+        print(f"riot: failed to transcode {url} ({e})")
+        return None
+
+    remember_splash(key, data)
+    await asyncio.to_thread(write_file, path, data)
+    return data
+
+def remember_splash(key: str, data: bytes):
     '''
-    Get champion skins by name.
+    Adds an image to the in-memory splash cache, evicting the least recently used over SPLASH_MEMORY_BYTES.
+    '''
+    global splash_bytes
+
+    splash_bytes += len(data) - len(splash_memory.pop(key, b""))
+    splash_memory[key] = data
+
+    while splash_bytes > SPLASH_MEMORY_BYTES and len(splash_memory) > 1:
+        splash_bytes -= len(splash_memory.popitem(last=False)[1])
+
+def transcode(data: bytes, width: int, quality: int) -> bytes:
+    '''
+    Returns an image downscaled to at most `width` pixels wide, encoded as WebP.
+    '''
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="WEBP", quality=quality, method=4)
+        return buffer.getvalue()
+
+# Match Stats
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------#
+
+# matches fetched at once for /stats, in the background
+STATS_CONCURRENCY = 4
+
+# column -> dtype
+STATS_COLUMNS = {
+    'creation': np.int64, 'duration': np.float64, 'win': np.bool_,
+    'kills': np.int32, 'deaths': np.int32, 'assists': np.int32, 'cs': np.int32, 'gold': np.int32, 'team_kills': np.int32,
+    'champion': 'U32', 'position': 'U16',
+}
+
+class MatchStats():
+    '''
+    One player's per-game stats in columnar arrays, oldest game first in a :func:`snapshot`.\n
+    Matches are added as they arrive, aggregates are computed over whole columns.
+    '''
+    def __init__(self, size: int):
+        self.size = 0
+        self.capacity = size
+        # matches fetched so far, including ones that failed
+        self.fetched = 0
+        self.columns = {name: np.zeros(size, dtype=dtype) for name, dtype in STATS_COLUMNS.items()}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name][:self.size]
+
+    def add(self, match: MatchSummary, puuid: str) -> bool:
+        '''
+        Adds a player's row from a match. Returns False if they did not play in it.
+        '''
+        if not (participant := match.participant(puuid)) or not match.gameDuration:
+            return False
+        team = match.team(participant.teamId)
+
+        row = {
+            'creation': match.gameCreation, 'duration': match.gameDuration, 'win': participant.win,
+            'kills': participant.kills, 'deaths': participant.deaths, 'assists': participant.assists,
+            'cs': participant.totalMinionsKilled + participant.neutralMinionsKilled, 'gold': participant.goldEarned,
+            'team_kills': team.kills if team else 0, 'champion': participant.championName, 'position': participant.teamPosition or "",
+        }
+        for name, value in row.items():
+            self.columns[name][self.size] = value
+
+        self.size += 1
+        return True
+
+    def snapshot(self) -> "MatchStats":
+        '''
+        Returns a copy of the rows so far ordered by game creation, safe to read in another thread while matches are added.
+        '''
+        order = np.argsort(self['creation'], kind='stable')
+
+        snapshot = MatchStats(0)
+        snapshot.size, snapshot.capacity, snapshot.fetched = self.size, self.capacity, self.fetched
+        snapshot.columns = {name: self[name][order] for name in self.columns}
+        return snapshot
+
+    def kda(self) -> np.ndarray:
+        return (self['kills'] + self['assists']) / np.maximum(self['deaths'], 1)
+
+    def cs_per_min(self) -> np.ndarray:
+        return 60 * self['cs'] / self['duration']
+
+    def kill_participation(self) -> np.ndarray:
+        return (self['kills'] + self['assists']) / np.maximum(self['team_kills'], 1)
+
+    def summary(self) -> dict:
+        '''
+        Returns the totals and averages over all games.
+        '''
+        minutes = self['duration'].sum() / 60
+        return {
+            'games': self.size, 'wins': int(self['win'].sum()), 'win_rate': self['win'].mean(),
+            'kills': self['kills'].mean(), 'deaths': self['deaths'].mean(), 'assists': self['assists'].mean(),
+            'kda': (self['kills'].sum() + self['assists'].sum()) / max(self['deaths'].sum(), 1),
+            'cs_per_min': self['cs'].sum() / minutes, 'gold_per_min': self['gold'].sum() / minutes,
+            'kill_participation': self.kill_participation().mean(),
+        }
+
+    def group(self, column: str) -> list[dict]:
+        '''
+        Returns the stats per value of a column, e.g. "champion", most played first.
+        '''
+        keys, inverse, counts = np.unique(self[column], return_inverse=True, return_counts=True)
+
+        def total(values: np.ndarray) -> np.ndarray:
+            return np.bincount(inverse, weights=values, minlength=len(keys))
+
+        wins = total(self['win'])
+        kda = total(self['kills'] + self['assists']) / np.maximum(total(self['deaths']), 1)
+        cs_per_min = 60 * total(self['cs']) / total(self['duration'])
+
+        return [{'name': str(keys[i]), 'games': int(counts[i]), 'win_rate': wins[i] / counts[i], 'kda': kda[i], 'cs_per_min': cs_per_min[i]}
+                for i in np.lexsort((-wins, -counts))]
+
+    def trend(self, window: int) -> dict[str, np.ndarray]:
+        '''
+        Returns the rolling averages of win rate, KDA, CS/min and kill participation over `window` games.
+        '''
+        window = max(1, min(window, self.size))
+
+        def rolling(values: np.ndarray) -> np.ndarray:
+            sums = np.cumsum(np.insert(values.astype(np.float64), 0, 0))
+            return (sums[window:] - sums[:-window]) / window
+
+        return {
+            'Win Rate': rolling(self['win']), 'KDA': rolling(self.kda()),
+            'CS/min': rolling(self.cs_per_min()), 'Kill Participation': rolling(self.kill_participation()),
+        }
+
+async def load_match_stats(stats: MatchStats, puuid: str, matchIds: list[str]):
+    '''
+    Adds a summoner's matches to `stats` as they arrive, most recent first.\n
+    Matches are fetched through the match cache as background requests, at most STATS_CONCURRENCY at a time,
+    so a long history is fetched at the pace the rate limits allow without starving interactive commands.
     '''
-    if champion := get_champion_by_name(championName):
-        [skin.update({'url' : DD_URL + f"/cdn/img/champion/splash/{champion['id']}_{skin['num']}.jpg"}) for skin in champion['skins']]
-        return champion['skins']
+    semaphore = asyncio.Semaphore(STATS_CONCURRENCY)
+
+    async def fetch(matchId: str):
+        async with semaphore:
+            try:
+                with background():
+                    if match := await get_match_by_id(matchId):
+                        stats.add(match, puuid)
+            except RateLimited as e:
+                print(f"riot: failed to fetch {matchId} ({e})")
+            finally:
+                stats.fetched += 1
+
+    await asyncio.gather(*[fetch(matchId) for matchId in matchIds])
+
+def plot_trends(stats: MatchStats, window: int) -> bytes:
+    '''
+    Returns a PNG chart of a player's rolling averages, see :func:`MatchStats.trend`.\n
+    Uses a standalone Figure rather than pyplot so it is safe to render in a worker thread.
+    '''
+    trends = stats.trend(window)
+    games = np.arange(len(stats) - len(trends['KDA']) + 1, len(stats) + 1)
+
+    figure = Figure(figsize=(8, 8))
+    axes = figure.subplots(len(trends), 1, sharex=True)
+
+    for ax, (label, values) in zip(axes, trends.items()):
+        ax.plot(games, values, linewidth=2)
+        ax.axhline(values.mean(), color="grey", linestyle="--", linewidth=1)
+        ax.set_ylabel(label)
+        ax.grid(alpha=0.3)
+
+    axes[0].set_title(f"{min(window, len(stats))} Game Rolling Average")
+    axes[-1].set_xlabel("Game")
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png", bbox_inches="tight", dpi=100)
+    return buffer.getvalue()